@@ -0,0 +1,86 @@
+import math
+import sqlite3
+from datetime import date, timedelta
+
+class TemplateBaseline():
+    """
+    A SQLite store of how often each normalised log template is seen per day, used to work out which
+    templates are new or unusually frequent compared to the days before.
+    """
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.executescript("""
+            CREATE TABLE IF NOT EXISTS templates (
+                template TEXT PRIMARY KEY,
+                first_seen TEXT NOT NULL,
+                last_seen TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS daily_counts (
+                template TEXT NOT NULL,
+                day TEXT NOT NULL,
+                count INTEGER NOT NULL,
+                PRIMARY KEY (template, day)
+            );
+            CREATE INDEX IF NOT EXISTS daily_counts_day ON daily_counts (day);
+        """)
+
+    def close(self):
+        self.connection.close()
+
+    def record_day(self, template_counts, day=None):
+        """
+        Store the counts for a day.  Re-running for the same day replaces that day's counts rather than adding to them.
+        """
+        day = (day or date.today()).isoformat()
+        with self.connection:
+            self.connection.executemany("""
+                INSERT INTO templates (template, first_seen, last_seen) VALUES (?, ?, ?)
+                ON CONFLICT (template) DO UPDATE SET
+                    first_seen = MIN(first_seen, excluded.first_seen),
+                    last_seen = MAX(last_seen, excluded.last_seen)
+            """, ((template, day, day) for template in template_counts))
+            self.connection.executemany("""
+                INSERT INTO daily_counts (template, day, count) VALUES (?, ?, ?)
+                ON CONFLICT (template, day) DO UPDATE SET count = excluded.count
+            """, ((template, day, count) for template, count in template_counts.items()))
+
+    def history(self, day, history_days):
+        """
+        The per-template daily counts for the history_days before day, plus the number of those days we have any data for
+        """
+        start_day = (day - timedelta(days=history_days)).isoformat()
+        rows = self.connection.execute(
+            "SELECT template, day, count FROM daily_counts WHERE day >= ? AND day < ?",
+            (start_day, day.isoformat())
+        ).fetchall()
+        counts = {}
+        days = set()
+        for template, row_day, count in rows:
+            counts.setdefault(template, []).append(count)
+            days.add(row_day)
+        return counts, len(days)
+
+    def novel_templates(self, template_counts, day=None, history_days=14, threshold=3.0):
+        """
+        The templates in template_counts which weren't seen in the previous history_days, or whose count today
+        is more than threshold standard deviations above their daily average.  Days without a template
+        count as zero for it.  If there is no history at all, everything is novel.
+        """
+        day = day or date.today()
+        history, days_with_data = self.history(day, history_days)
+        if days_with_data == 0:
+            return set(template_counts)
+        novel = set()
+        for template, count in template_counts.items():
+            previous_counts = history.get(template)
+            if not previous_counts:
+                novel.add(template)
+                continue
+            previous_counts = previous_counts + [0] * (days_with_data - len(previous_counts))
+            mean = sum(previous_counts) / days_with_data
+            variance = sum((previous - mean) ** 2 for previous in previous_counts) / days_with_data
+            # counts are roughly Poisson, so never trust a spread smaller than sqrt(mean)
+            spread = max(math.sqrt(variance), math.sqrt(mean), 1)
+            if count > mean + threshold * spread:
+                novel.add(template)
+        return novel
@@ -0,0 +1,98 @@
+"""
+Run main.py end to end against the local mock LLM server (benchmarks/mock_llm.py), with several copies running
+at once, to see how the whole pipeline copes with latency, errors and concurrency without paying for tokens.
+
+    python benchmarks/end_to_end.py --concurrency 1,2,4,8 --latency lognormal:0.5,0.5 --error-rate 0.05
+    python benchmarks/end_to_end.py --file /var/log/syslog --model claude-3-haiku-20240229 -- --host-chunks
+
+Each concurrency level starts that many main.py runs on the same log at the same time (like one run per site
+from cron) and reports the wall time, requests/sec and tokens/sec the mock server saw.  Without --file a
+synthetic log is generated.  Anything after -- is passed on to main.py.
+"""
+import os
+import sys
+import time
+import random
+import argparse
+import tempfile
+import subprocess
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mock_llm
+
+package_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+words = ["alpha", "bravo", "charlie", "delta", "echo", "foxtrot", "golf", "hotel"]
+programs = ["sshd[{pid}]", "kernel", "nginx[{pid}]", "postfix/smtpd[{pid}]", "app[{pid}]"]
+problems = ["error reading block {pid}", "segfault at {pid}", "connection refused by 10.0.0.{octet}", "Out of memory: Killed process {pid}"]
+
+def synthetic_log(path, line_count, host_count):
+    # enough distinct messages that the duplicate filter leaves several chunks
+    with open(path, "w") as f:
+        for i in range(line_count):
+            if random.random() < 0.01:
+                message = random.choice(problems)
+            else:
+                message = " ".join(random.choice(words) for _ in range(2)) + " {pid}"
+            message = message.format(pid=random.randint(100, 99999), octet=random.randint(2, 254))
+            program = random.choice(programs).format(pid=random.randint(100, 99999))
+            f.write(f"Nov  8 {i * 24 // line_count:02d}:{i % 60:02d}:{i % 59:02d} host{random.randint(1, host_count)} {program}: {message}\n")
+
+def run_level(concurrency, log_path, work_dir, model, env, extra_args):
+    commands = []
+    run_dirs = []
+    for run in range(concurrency):
+        # each run gets its own working directory, so nothing main.py writes relative to it is shared
+        run_dirs.append(tempfile.mkdtemp(prefix=f"run-{concurrency}-{run}-", dir=work_dir))
+        commands.append([
+            sys.executable, os.path.join(package_dir, "main.py"), "--file", log_path,
+            "--output-file", os.path.join(work_dir, f"report-{concurrency}-{run}.md"),
+            "--issue-model", model, "--suggestion-model", model,
+            "--run-dir", "", "--resolution-cache", "",
+            "--config-cache", os.path.join(work_dir, "config_cache"),
+        ] + extra_args)
+    start_time = time.perf_counter()
+    processes = [subprocess.Popen(command, cwd=run_dir, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True) for command, run_dir in zip(commands, run_dirs)]
+    failures = []
+    for process in processes:
+        _, errors = process.communicate()
+        if process.returncode != 0:
+            failures.append(errors.strip().splitlines()[-1] if errors.strip() else f"exit code {process.returncode}")
+    return time.perf_counter() - start_time, failures
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--file", type=str, required=False, default="")
+    parser.add_argument("--lines", type=int, required=False, default=20000)
+    parser.add_argument("--hosts", type=int, required=False, default=20)
+    parser.add_argument("--concurrency", type=str, required=False, default="1,2,4,8")
+    parser.add_argument("--model", type=str, required=False, default="gpt-4o-mini")
+    parser.add_argument("--latency", type=str, required=False, default="lognormal:0.5,0.5")
+    parser.add_argument("--error-rate", type=float, required=False, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, required=False, default=0.0)
+    parser.add_argument("--issues-per-chunk", type=int, required=False, default=3)
+    args, extra_args = parser.parse_known_args()
+    extra_args = [arg for arg in extra_args if arg != "--"]
+
+    random.seed(42)
+    work_dir = tempfile.mkdtemp()
+    log_path = os.path.abspath(args.file) if args.file else ""
+    if not log_path:
+        log_path = os.path.join(work_dir, "syslog")
+        synthetic_log(log_path, args.lines, args.hosts)
+
+    server, openai_url, anthropic_url = mock_llm.run_server(latency=args.latency, error_rate=args.error_rate, truncate_rate=args.truncate_rate, issues_per_chunk=args.issues_per_chunk)
+    env = dict(os.environ, OPENAI_BASE_URL=openai_url, ANTHROPIC_BASE_URL=anthropic_url, OLLAMA_BASE_URL=openai_url)
+    env.setdefault("OPENAI_API_KEY", "mock")
+    env.setdefault("ANTHROPIC_API_KEY", "mock")
+
+    print(f"{args.model} against the mock server ({args.latency}, {args.error_rate:.0%} errors, {args.truncate_rate:.0%} truncated), log {log_path}")
+    print(f"{'Runs':>5} {'Wall s':>8} {'Requests':>9} {'Errors':>7} {'Req/s':>7} {'Tokens/s':>9} {'s per run':>10}  Failures")
+    for concurrency in [int(level) for level in args.concurrency.split(",")]:
+        server.reset_stats()
+        wall_time, failures = run_level(concurrency, log_path, work_dir, args.model, env, extra_args)
+        stats = server.stats
+        tokens = stats["input_tokens"] + stats["output_tokens"]
+        print(f"{concurrency:>5} {wall_time:>8.2f} {stats['requests']:>9} {stats['errors']:>7} {stats['requests'] / wall_time:>7.1f} {tokens / wall_time:>9.0f} {wall_time / concurrency:>10.2f}  {len(failures)}")
+        for failure in failures[:3]:
+            print(f"      {failure}")
+    server.shutdown()
@@ -0,0 +1,65 @@
+"""
+Compare the throughput of the text syslog and journal JSON input paths on the same synthetic log.
+
+    python benchmarks/input_formats.py --lines 200000
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import logreader
+
+messages = [
+    ("sshd", "Failed password for root from 10.0.{a}.{b} port {pid} ssh2", 5),
+    ("CRON", "(root) CMD (run-parts /etc/cron.hourly)", 6),
+    ("kernel", "eth0: link down error {pid}", 3),
+    ("systemd", "Started Session {pid} of user someone.", 6),
+    ("nagios", "CURRENT HOST STATE: h{pid}.example.com;DOWN;HARD;10;PING CRITICAL - Packet loss = 100%", 2),
+]
+
+def write_logs(directory, line_count):
+    text_path = os.path.join(directory, "syslog")
+    journal_path = os.path.join(directory, "journal.json")
+    with open(text_path, "w") as text_file, open(journal_path, "w") as journal_file:
+        for i in range(line_count):
+            host = f"host{random.randint(1, 50)}"
+            identifier, message, priority = random.choice(messages)
+            pid = random.randint(100, 99999)
+            message = message.format(a=i % 255, b=pid % 255, pid=pid)
+            timestamp = 1731024000 + i
+            text_file.write(f"{logreader._format_syslog_timestamp(logreader.datetime.fromtimestamp(timestamp))} {host} {identifier}[{pid}]: {message}\n")
+            journal_file.write(json.dumps({
+                "__REALTIME_TIMESTAMP": str(timestamp * 1000000),
+                "_HOSTNAME": host,
+                "SYSLOG_IDENTIFIER": identifier,
+                "SYSLOG_PID": str(pid),
+                "PRIORITY": str(priority),
+                "MESSAGE": message,
+            }) + "\n")
+    return text_path, journal_path
+
+def time_path(path, journal):
+    start_time = time.time()
+    lines = logreader.read_logfile(path, [], [], {}, [], journal=journal)
+    read_time = time.time() - start_time
+    start_time = time.time()
+    logreader.filter_duplicate_logs(lines, with_scores=True)
+    return len(lines), read_time, time.time() - start_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--lines", type=int, required=False, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        text_path, journal_path = write_logs(directory, args.lines)
+        print(f"JSON decoder: {logreader.json_loads.__module__}")
+        for name, path, journal in (("text", text_path, False), ("journal", journal_path, True)):
+            line_count, read_time, dedup_time = time_path(path, journal)
+            total_time = read_time + dedup_time
+            print(f"{name:>8}: read {read_time:.2f}s, normalise/dedup {dedup_time:.2f}s, {line_count / total_time:,.0f} lines/sec")
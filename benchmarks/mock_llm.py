@@ -0,0 +1,181 @@
+"""
+A local stand-in for the OpenAI and Anthropic chat APIs, so scans can be tested without paying for tokens.
+
+    python benchmarks/mock_llm.py --port 8000 --latency lognormal:0.8,0.5 --error-rate 0.05
+    OPENAI_BASE_URL=http://127.0.0.1:8000/v1 ANTHROPIC_BASE_URL=http://127.0.0.1:8000 OPENAI_API_KEY=mock ANTHROPIC_API_KEY=mock python main.py --file syslog
+
+It answers /v1/chat/completions and /v1/messages, working out from the system prompt what is being asked:
+the log scan gets an issue for each line with a severity keyword in it (up to --issues-per-chunk), the merge
+gets nothing to merge, the triage prompt flags chunks with a severity keyword, and anything else gets a
+canned resolution.  Latencies are fixed:SECONDS, uniform:LOW,HIGH, lognormal:MEDIAN,SIGMA or exponential:MEAN.
+--error-rate answers that share of requests with a 429 or 500 (which the SDKs retry), and --truncate-rate
+cuts that share of answers off as if they ran out of output tokens.
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import logreader
+
+def latency_sampler(spec):
+    """
+    A function returning a random latency in seconds, from a spec like "lognormal:0.8,0.5"
+    """
+    kind, _, values = spec.partition(":")
+    values = [float(value) for value in values.split(",") if value]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        return lambda: random.lognormvariate(math.log(values[0]), values[1])
+    if kind == "exponential":
+        return lambda: random.expovariate(1 / values[0])
+    raise ValueError(f"Unknown latency distribution '{spec}' - use fixed, uniform, lognormal or exponential")
+
+def canned_issues(content, limit):
+    issues = []
+    for line in content.splitlines():
+        lower_line = line.lower()
+        if not any(logreader.has_severity_keyword(lower_line, keyword) for keyword in logreader.default_severity_keywords):
+            continue
+        issues.append({
+            "issue": f"Problem on {logreader.line_hostname(line)}",
+            "description": "Canned issue from the mock LLM server",
+            "example_log_entry": line,
+            "affected_host(s)": logreader.line_hostname(line),
+            "affected_service": "mock",
+            "timestamp/frequency": line[:15],
+            "potential_impact": "None, this is a mock",
+            "recommended_action": "Nothing",
+        })
+        if len(issues) >= limit:
+            break
+    return issues
+
+def canned_reply(system_prompt, content, issues_per_chunk):
+    if "needs_review" in system_prompt:
+        lower_content = content.lower()
+        flagged = any(logreader.has_severity_keyword(lower_content, keyword) for keyword in logreader.default_severity_keywords)
+        return json.dumps({"needs_review": flagged, "reason": "mock"}), "triage"
+    if "merged_issues" in system_prompt:
+        return json.dumps({"merged_issues": []}), "merge"
+    if '"issues"' in system_prompt:
+        return json.dumps({"issues": canned_issues(content, issues_per_chunk)}), "scan"
+    return "1. Check the mock.\n2. Restart the mock.\n", "resolution"
+
+class MockLLMServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency="fixed:0", latencies=None, error_rate=0.0, truncate_rate=0.0, issues_per_chunk=3):
+        super().__init__(address, MockLLMHandler)
+        # latencies can give some kinds of request (eg, "triage") their own distribution
+        self.latency = latency_sampler(latency)
+        self.latencies = {kind: latency_sampler(spec) for kind, spec in (latencies or {}).items()}
+        self.error_rate = error_rate
+        self.truncate_rate = truncate_rate
+        self.issues_per_chunk = issues_per_chunk
+        self.lock = threading.Lock()
+        self.reset_stats()
+
+    def reset_stats(self):
+        with self.lock:
+            self.stats = {"requests": 0, "errors": 0, "truncated": 0, "input_tokens": 0, "output_tokens": 0}
+
+    def count(self, **counts):
+        with self.lock:
+            for name, value in counts.items():
+                self.stats[name] += value
+
+class MockLLMHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def send_json(self, status, body):
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_POST(self):
+        server = self.server
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        anthropic = self.path.rstrip("/").endswith("/messages")
+        if not anthropic and not self.path.rstrip("/").endswith("/chat/completions"):
+            self.send_json(404, {"error": {"type": "not_found", "message": f"No mock for {self.path}"}})
+            return
+        messages = request["messages"]
+        system_prompt = request.get("system", "") if anthropic else next((message["content"] for message in messages if message["role"] == "system"), "")
+        content = messages[-1]["content"]
+        reply, kind = canned_reply(system_prompt, content, server.issues_per_chunk)
+        time.sleep(server.latencies.get(kind, server.latency)())
+
+        server.count(requests=1)
+        if random.random() < server.error_rate:
+            server.count(errors=1)
+            status = random.choice([429, 500])
+            self.send_json(status, {"type": "error", "error": {"type": "rate_limit_error" if status == 429 else "api_error", "message": "Mock failure"}})
+            return
+        truncated = random.random() < server.truncate_rate
+        if truncated:
+            reply = reply[:len(reply) // 2]
+            server.count(truncated=1)
+        input_tokens = (len(system_prompt) + sum(len(str(message["content"])) for message in messages)) // 4
+        output_tokens = len(reply) // 4
+        server.count(input_tokens=input_tokens, output_tokens=output_tokens)
+        if anthropic:
+            self.send_json(200, {
+                "id": "msg_mock",
+                "type": "message",
+                "role": "assistant",
+                "model": request["model"],
+                "content": [{"type": "text", "text": reply}],
+                "stop_reason": "max_tokens" if truncated else "end_turn",
+                "stop_sequence": None,
+                "usage": {"input_tokens": input_tokens, "output_tokens": output_tokens},
+            })
+        else:
+            self.send_json(200, {
+                "id": "chatcmpl-mock",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": request["model"],
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": reply}, "finish_reason": "length" if truncated else "stop"}],
+                "usage": {"prompt_tokens": input_tokens, "completion_tokens": output_tokens, "total_tokens": input_tokens + output_tokens},
+            })
+
+def run_server(port=0, **options):
+    """
+    Start a mock server on a background thread.  Returns the server and its OpenAI and Anthropic base URLs.
+    """
+    server = MockLLMServer(("127.0.0.1", port), **options)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    address = f"http://127.0.0.1:{server.server_address[1]}"
+    return server, f"{address}/v1", address
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, required=False, default=8000)
+    parser.add_argument("--latency", type=str, required=False, default="lognormal:0.8,0.5")
+    parser.add_argument("--error-rate", type=float, required=False, default=0.0)
+    parser.add_argument("--truncate-rate", type=float, required=False, default=0.0)
+    parser.add_argument("--issues-per-chunk", type=int, required=False, default=3)
+    args = parser.parse_args()
+
+    server, openai_url, anthropic_url = run_server(args.port, latency=args.latency, error_rate=args.error_rate, truncate_rate=args.truncate_rate, issues_per_chunk=args.issues_per_chunk)
+    print(f"Mock LLM server running - OPENAI_BASE_URL={openai_url} ANTHROPIC_BASE_URL={anthropic_url}")
+    try:
+        while True:
+            time.sleep(10)
+            print(server.stats)
+    except KeyboardInterrupt:
+        server.shutdown()
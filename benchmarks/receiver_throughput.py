@@ -0,0 +1,82 @@
+"""
+Measure how many messages/second the syslog receiver can filter, normalise and deduplicate on one core.
+A separate process replays a synthetic log to it over TCP (lossless) or UDP (shows drops).
+
+    python benchmarks/receiver_throughput.py --messages 200000 --protocol tcp
+"""
+import os
+import sys
+import time
+import random
+import asyncio
+import argparse
+import multiprocessing
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import logreader
+import receiver
+
+templates = [
+    "sshd[{pid}]: Failed password for root from 10.0.{a}.{b} port {pid} ssh2",
+    "CRON[{pid}]: (root) CMD (run-parts /etc/cron.hourly)",
+    "kernel: [{pid}.{b}] eth0: link down error {a}",
+    "systemd[1]: Started Session {pid} of user someone.",
+    "nagios: CURRENT HOST STATE: h{pid}.example.com;DOWN;HARD;10;PING CRITICAL - Packet loss = 100%",
+    "postfix/smtpd[{pid}]: connect from unknown[10.1.{a}.{b}]",
+]
+
+def synthetic_lines(count):
+    lines = []
+    for i in range(count):
+        host = f"host{random.randint(1, 200)}"
+        pid = random.randint(100, 99999)
+        message = random.choice(templates).format(pid=pid, a=i % 255, b=pid % 255)
+        lines.append(f"Nov  8 {(i // 3600) % 24:02d}:{(i // 60) % 60:02d}:{i % 60:02d} {host} {message}")
+    return lines
+
+def sender(lines, port, protocol):
+    time.sleep(0.5)
+    receiver.send_messages(lines, "127.0.0.1", port, protocol)
+
+async def run(message_count, protocol, port):
+    windows = []
+    done = asyncio.Event()
+    state = {"first": None, "last": None}
+    syslog_receiver = receiver.SyslogReceiver(logreader.make_line_filter([], [], {}), [], windows.append, window_seconds=3600, max_lines=10**9)
+    handle_message = syslog_receiver.handle_message
+
+    def counting_handle_message(message, peer_host="UNKNOWN_HOST"):
+        if state["first"] is None:
+            state["first"] = time.time()
+        handle_message(message, peer_host)
+        state["last"] = time.time()
+        if syslog_receiver.window.received >= message_count:
+            done.set()
+
+    syslog_receiver.handle_message = counting_handle_message
+    loop = asyncio.get_running_loop()
+    if protocol == "udp":
+        transport, _ = await loop.create_datagram_endpoint(lambda: receiver.SyslogUDPProtocol(syslog_receiver), local_addr=("127.0.0.1", port))
+        transport.get_extra_info("socket").setsockopt(receiver.socket.SOL_SOCKET, receiver.socket.SO_RCVBUF, 16 * 1024 * 1024)
+    else:
+        server = await loop.create_server(lambda: receiver.SyslogTCPProtocol(syslog_receiver), "127.0.0.1", port)
+    process = multiprocessing.Process(target=sender, args=(synthetic_lines(message_count), port, protocol))
+    process.start()
+    # stop when everything has arrived, or (for UDP, which drops) nothing has arrived for a couple of seconds
+    start_time = time.time()
+    while not done.is_set():
+        await asyncio.sleep(0.1)
+        if time.time() - (state["last"] or start_time) > 2 and not process.is_alive():
+            break
+    elapsed = (state["last"] or time.time()) - (state["first"] or time.time())
+    process.join()
+    window = syslog_receiver.window
+    print(f"{protocol}: {window.received} of {message_count} messages received in {elapsed:.2f}s -> {window.received / max(elapsed, 1e-9):,.0f} msgs/sec, {len(window.lines)} kept after dedup")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, required=False, default=200000)
+    parser.add_argument("--protocol", type=str, required=False, default="tcp", choices=["tcp", "udp"])
+    parser.add_argument("--port", type=int, required=False, default=15514)
+    args = parser.parse_args()
+    asyncio.run(run(args.messages, args.protocol, args.port))
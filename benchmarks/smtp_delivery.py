@@ -0,0 +1,141 @@
+"""
+Compare sending report emails over a new connection per message (as mailer.send_email does) against mailer.send_batch, using a
+local debugging SMTP server which just counts what it receives.
+
+    python benchmarks/smtp_delivery.py --messages 40 --recipients 5 --latency-ms 20
+
+--latency-ms delays the server's answer to each client round trip to stand in for a remote mail server, and --drop-every makes the server
+hang up after every N messages to check the batch reconnects and retries.  Use --no-pipelining to see the
+batch without RFC 2920 pipelining.
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import socketserver
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import mailer
+
+class DebuggingSMTPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, address, latency, pipelining, drop_every):
+        super().__init__(address, SMTPHandler)
+        self.latency = latency
+        self.pipelining = pipelining
+        self.drop_every = drop_every
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.messages = 0
+        self.deliveries = 0
+
+class SMTPHandler(socketserver.BaseRequestHandler):
+    """
+    Reads whatever the client has sent, answers every complete command in it, then waits the simulated
+    latency before sending all the replies together - so each client round trip costs one latency
+    """
+    def handle(self):
+        server = self.server
+        with server.lock:
+            server.connections += 1
+        self.request.sendall(b"220 localhost debugging SMTP server\r\n")
+        buffer = b""
+        in_data = False
+        recipients = 0
+        session_messages = 0
+        while True:
+            received = self.request.recv(65536)
+            if not received:
+                return
+            buffer += received
+            replies = []
+            hang_up = False
+            while b"\n" in buffer and not hang_up:
+                line, buffer = buffer.split(b"\n", 1)
+                if in_data:
+                    if line.rstrip(b"\r") != b".":
+                        continue
+                    in_data = False
+                    session_messages += 1
+                    with server.lock:
+                        server.messages += 1
+                        server.deliveries += recipients
+                    if server.drop_every and session_messages % server.drop_every == 0:
+                        # hang up without acknowledging, as a server restarting would
+                        hang_up = True
+                    else:
+                        replies.append("250 OK queued")
+                    continue
+                command = line.decode("utf-8", "replace").strip()
+                verb = command.split(" ", 1)[0].upper().split(":")[0]
+                if verb in ("EHLO", "HELO"):
+                    replies.append("250-localhost\r\n250-PIPELINING\r\n250 8BITMIME" if server.pipelining else "250 localhost")
+                elif verb == "MAIL":
+                    recipients = 0
+                    replies.append("250 OK")
+                elif verb == "RCPT":
+                    recipients += 1
+                    replies.append("250 OK")
+                elif verb == "DATA":
+                    in_data = True
+                    replies.append("354 End data with <CR><LF>.<CR><LF>")
+                elif verb in ("RSET", "NOOP"):
+                    replies.append("250 OK")
+                elif verb == "QUIT":
+                    replies.append("221 Bye")
+                    hang_up = True
+                else:
+                    replies.append("502 Command not implemented")
+            if replies:
+                if server.latency:
+                    time.sleep(server.latency)
+                self.request.sendall("".join(f"{reply}\r\n" for reply in replies).encode())
+            if hang_up:
+                return
+
+def run_server(latency, pipelining, drop_every):
+    server = DebuggingSMTPServer(("127.0.0.1", 0), latency, pipelining, drop_every)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, required=False, default=40)
+    parser.add_argument("--recipients", type=int, required=False, default=5)
+    parser.add_argument("--latency-ms", type=float, required=False, default=20)
+    parser.add_argument("--report-kb", type=int, required=False, default=50)
+    parser.add_argument("--drop-every", type=int, required=False, default=0)
+    parser.add_argument("--no-pipelining", action="store_true", required=False, default=False)
+    args = parser.parse_args()
+
+    report = ("- Issue: something broke on host1\n  - Example log entry: `Nov  8 00:00:01 host1 sshd[123]: error`\n" * (args.report_kb * 12))[:args.report_kb * 1024]
+    groups = [",".join(f"team{group}-person{person}@example.com" for person in range(args.recipients)) for group in range(args.messages)]
+    latency = args.latency_ms / 1000
+
+    server = run_server(latency, not args.no_pipelining, 0)
+    start_time = time.perf_counter()
+    for group in groups:
+        message = mailer.create_message("reports@example.com", group, "Syslog Report", attachment_bytes=report.encode(), attachment_name="report.md")
+        sender, recipients, data = mailer.message_envelope(message)
+        with mailer.smtplib.SMTP("127.0.0.1", server.server_address[1]) as connection:
+            connection.sendmail(sender, recipients, data)
+    single_time = time.perf_counter() - start_time
+    single_connections = server.connections
+    server.shutdown()
+
+    server = run_server(latency, not args.no_pipelining, args.drop_every)
+    start_time = time.perf_counter()
+    results = mailer.send_batch(mailer.report_messages(report, groups, "reports@example.com"), "127.0.0.1", server.server_address[1], retry_delay=0)
+    batch_time = time.perf_counter() - start_time
+    server.shutdown()
+
+    failed = sum(1 for _, result in results if result is not None)
+    print(f"{args.messages} messages x {args.recipients} recipients, {args.report_kb}KB report, {args.latency_ms:.0f}ms per round trip")
+    print(f"Connection per message: {single_time:6.2f}s ({args.messages / single_time:6.1f} msgs/sec, {single_connections} connections)")
+    print(f"send_batch:             {batch_time:6.2f}s ({args.messages / batch_time:6.1f} msgs/sec, {server.connections} connections, "
+          f"{'pipelined' if not args.no_pipelining else 'not pipelined'}, {failed} failed)")
+    # with --drop-every the server sees the dropped message again on the retry, so it can count more than were sent
+    print(f"Server received {server.messages} messages for {server.deliveries} recipients")
@@ -0,0 +1,77 @@
+"""
+Measure how long it takes to start main.py, and fail if importing it goes over budget.
+
+    python benchmarks/startup.py --runs 10 --budget-ms 100
+
+Each run is a fresh interpreter, so this includes everything a `--dry-count` or `--show-log` run pays
+before it reads a line.  The slowest imports (from `python -X importtime`) are listed to show what to make lazy.
+"""
+import os
+import sys
+import time
+import argparse
+import statistics
+import subprocess
+import tempfile
+
+package_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+
+def time_command(command, runs):
+    """
+    Median wall time of a command in ms, or None if it fails
+    """
+    timings = []
+    for _ in range(runs):
+        start_time = time.perf_counter()
+        result = subprocess.run(command, cwd=package_dir, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        if result.returncode != 0:
+            return None
+        timings.append((time.perf_counter() - start_time) * 1000)
+    return statistics.median(timings)
+
+def slowest_imports(count):
+    result = subprocess.run([sys.executable, "-X", "importtime", "-c", "import main"], cwd=package_dir, capture_output=True, text=True)
+    imports = []
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        name = name.rstrip()[1:]
+        # nested imports are indented two spaces per level - only show main and what it imports directly
+        if len(name) - len(name.lstrip()) <= 2:
+            imports.append((int(cumulative), name.strip()))
+    return sorted(imports, reverse=True)[:count]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--runs", type=int, required=False, default=10)
+    parser.add_argument("--budget-ms", type=float, required=False, default=100)
+    parser.add_argument("--top", type=int, required=False, default=10)
+    args = parser.parse_args()
+
+    baseline_ms = time_command([sys.executable, "-c", "pass"], args.runs)
+    import_ms = time_command([sys.executable, "-c", "import main"], args.runs)
+    with tempfile.TemporaryDirectory() as directory:
+        log_path = os.path.join(directory, "syslog")
+        with open(log_path, "w") as f:
+            f.write("Nov  8 00:00:01 host1 sshd[123]: Failed password for root from 10.0.0.1 port 22 ssh2\n" * 100)
+        show_log_ms = time_command([sys.executable, "main.py", "--file", log_path, "--show-log", "--dry-count", "--top-templates", "0", "--config-cache", os.path.join(directory, "cache")], args.runs)
+
+    if import_ms is None:
+        print("Error: `import main` failed", file=sys.stderr)
+        sys.exit(1)
+    import_cost = import_ms - baseline_ms
+    print(f"Interpreter start:       {baseline_ms:7.1f} ms")
+    print(f"import main:             {import_ms:7.1f} ms ({import_cost:.1f} ms over a bare interpreter, budget {args.budget_ms:.0f} ms)")
+    if show_log_ms is None:
+        # tiktoken downloads its encoding the first time, so this fails offline
+        print("main.py --dry-count run: failed (is the tiktoken encoding available?)")
+    else:
+        print(f"main.py --dry-count run: {show_log_ms:7.1f} ms (includes loading the tiktoken encoding)")
+    print(f"\nSlowest imports (cumulative):")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"{cumulative / 1000:8.1f} ms  {name}")
+    if import_cost > args.budget_ms:
+        print(f"\nOver budget by {import_cost - args.budget_ms:.1f} ms", file=sys.stderr)
+        sys.exit(1)
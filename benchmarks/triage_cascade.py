@@ -0,0 +1,122 @@
+"""
+Measure the local-triage cascade (--triage-model) against a corpus of chunks labelled with whether they need review.
+
+    python benchmarks/triage_cascade.py --corpus chunks.jsonl
+    python benchmarks/triage_cascade.py --ollama-url http://localhost:11434/v1 --triage-model llama3.2
+
+The corpus is JSON lines of {"lines": [...], "needs_review": true/false}.  Without one a synthetic corpus is used
+(--write-corpus saves it so it can be hand-edited).  Everything is served by the mock LLM server in mock_llm.py:
+the "cloud" model answers after --cloud-latency seconds, and unless --ollama-url points at a real Ollama the
+triage model flags any chunk with a severity keyword in it after --triage-latency seconds.
+The stub's precision/recall only checks the plumbing - point it at Ollama to measure a real model.
+"""
+import os
+import sys
+import json
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import main
+import prompts
+import mock_llm
+
+routine_messages = [
+    "CRON[{pid}]: (root) CMD (run-parts /etc/cron.hourly)",
+    "systemd[1]: Started Session {pid} of user someone.",
+    "sshd[{pid}]: Accepted publickey for deploy from 10.0.0.{octet} port {pid} ssh2",
+    "systemd-logind[{pid}]: Removed session {pid}.",
+    "dhclient[{pid}]: DHCPACK of 10.0.0.{octet} from 10.0.0.1",
+]
+problem_messages = [
+    "kernel: Out of memory: Killed process {pid} (java)",
+    "sshd[{pid}]: Failed password for root from 203.0.113.{octet} port {pid} ssh2",
+    "kernel: EXT4-fs error (device sda1): ext4_find_entry:1455: inode #{pid}: comm nginx: reading directory lblock 0",
+    "systemd[1]: postgresql.service: Main process exited, code=killed, status=9/KILL",
+    # no severity keyword, so a keyword-only triage will miss it
+    "kernel: e1000e 0000:00:19.0 eth0: Reset adapter unexpectedly",
+]
+
+def synthetic_corpus(chunk_count, chunk_lines, problem_share):
+    corpus = []
+    for chunk_index in range(chunk_count):
+        lines = []
+        for i in range(chunk_lines):
+            message = random.choice(routine_messages).format(pid=random.randint(100, 99999), octet=random.randint(2, 254))
+            lines.append(f"Nov  8 {chunk_index % 24:02d}:{i % 60:02d}:00 host{random.randint(1, 5)} {message}")
+        needs_review = random.random() < problem_share
+        if needs_review:
+            for _ in range(random.randint(1, 3)):
+                message = random.choice(problem_messages).format(pid=random.randint(100, 99999), octet=random.randint(2, 254))
+                lines[random.randrange(len(lines))] = f"Nov  8 {chunk_index % 24:02d}:30:00 host{random.randint(1, 5)} {message}"
+        corpus.append({"lines": lines, "needs_review": needs_review})
+    return corpus
+
+def load_corpus(path):
+    with open(path, "r") as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def run_scan(corpus, chunk_lines, issue_model, triage_model=""):
+    lines = [line for chunk in corpus for line in chunk["lines"]]
+    start_time = time.time()
+    _, cost = main.scan_logfile(lines, prompts.log_scan_prompt, prompts.log_merge_prompt, line_chunk_size=chunk_lines, model=issue_model, triage_model=triage_model, triage_prompt=prompts.triage_prompt)
+    return cost, time.time() - start_time
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--corpus", type=str, required=False, default="")
+    parser.add_argument("--write-corpus", type=str, required=False, default="")
+    parser.add_argument("--chunks", type=int, required=False, default=40)
+    parser.add_argument("--chunk-lines", type=int, required=False, default=200)
+    parser.add_argument("--problem-share", type=float, required=False, default=0.3)
+    parser.add_argument("--issue-model", type=str, required=False, default=main.default_model)
+    parser.add_argument("--triage-model", type=str, required=False, default="llama3.2")
+    parser.add_argument("--ollama-url", type=str, required=False, default="")
+    parser.add_argument("--triage-latency", type=float, required=False, default=0.2)
+    parser.add_argument("--cloud-latency", type=float, required=False, default=1.0)
+    args = parser.parse_args()
+
+    random.seed(42)
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.chunks, args.chunk_lines, args.problem_share)
+    if args.write_corpus:
+        with open(args.write_corpus, "w") as f:
+            f.writelines(json.dumps(chunk) + "\n" for chunk in corpus)
+    # the cost comparison scans the corpus as one log, so only full size chunks line up with the scan's chunks -
+    # shorter ones still count towards precision/recall
+    chunk_lines = max(len(chunk["lines"]) for chunk in corpus)
+    scan_corpus = [chunk for chunk in corpus if len(chunk["lines"]) == chunk_lines]
+
+    server, stub_url, _ = mock_llm.run_server(latency=f"fixed:{args.cloud_latency}", latencies={"triage": f"fixed:{args.triage_latency}"})
+    os.environ["OPENAI_BASE_URL"] = stub_url
+    os.environ["OLLAMA_BASE_URL"] = args.ollama_url or stub_url
+    os.environ.setdefault("OPENAI_API_KEY", "stub")
+
+    true_positives = false_positives = false_negatives = true_negatives = 0
+    triage_times = []
+    for chunk in corpus:
+        start_time = time.time()
+        flagged = main.triage_chunk("\n".join(chunk["lines"]), prompts.triage_prompt, args.triage_model)
+        triage_times.append(time.time() - start_time)
+        if flagged and chunk["needs_review"]:
+            true_positives += 1
+        elif flagged:
+            false_positives += 1
+        elif chunk["needs_review"]:
+            false_negatives += 1
+        else:
+            true_negatives += 1
+    precision = true_positives / max(true_positives + false_positives, 1)
+    recall = true_positives / max(true_positives + false_negatives, 1)
+
+    direct_cost, direct_time = run_scan(scan_corpus, chunk_lines, args.issue_model)
+    cascade_cost, cascade_time = run_scan(scan_corpus, chunk_lines, args.issue_model, args.triage_model)
+    server.shutdown()
+
+    print(f"Corpus: {len(corpus)} chunks of up to {chunk_lines} lines, {sum(chunk['needs_review'] for chunk in corpus)} need review")
+    if len(scan_corpus) < len(corpus):
+        print(f"The costs below only cover the {len(scan_corpus)} chunks of {chunk_lines} lines - {len(corpus) - len(scan_corpus)} shorter chunks were only triaged")
+    print(f"Triage ({args.triage_model}{' via ' + args.ollama_url if args.ollama_url else ', stub'}): precision {precision:.2f}, recall {recall:.2f} "
+          f"(tp {true_positives}, fp {false_positives}, fn {false_negatives}, tn {true_negatives}), {sum(triage_times) / len(triage_times):.2f}s per chunk")
+    print(f"Direct to {args.issue_model}: US${direct_cost:.4f} in {direct_time:.1f}s")
+    print(f"Cascade:        US${cascade_cost:.4f} in {cascade_time:.1f}s ({(1 - cascade_cost / direct_cost) * 100 if direct_cost else 0:.0f}% cheaper)")
@@ -0,0 +1,65 @@
+import os
+import json
+import shutil
+import hashlib
+
+default_run_dir = "runs"
+
+def chunk_hash(chunk: list[str]) -> str:
+    return hashlib.sha1("\n".join(chunk).encode("utf-8", "surrogateescape")).hexdigest()
+
+def config_hash(*settings) -> str:
+    """
+    A hash of everything that changes what a chunk scan returns (prompt, model etc)
+    """
+    return hashlib.sha1(json.dumps([str(setting) for setting in settings]).encode()).hexdigest()
+
+class RunJournal():
+    """
+    An append-only journal of the chunks a scan has finished, so a run that dies part way through can pick up
+    where it left off.  Each run gets its own directory under run_dir, named from the hash of its (filtered)
+    input lines and its config, so a resume only ever reuses results from exactly the same scan.
+    """
+    def __init__(self, run_dir, lines, scan_config, resume=False):
+        input_key = chunk_hash(lines)
+        self.path = os.path.join(run_dir, f"{input_key[:16]}-{scan_config[:16]}")
+        self.journal_path = os.path.join(self.path, "chunks.jsonl")
+        self.done = {}
+        os.makedirs(self.path, exist_ok=True)
+        if resume:
+            self.done = self.load()
+        elif os.path.exists(self.journal_path):
+            os.remove(self.journal_path)
+        self.file = open(self.journal_path, "a", encoding="utf-8")
+
+    def load(self):
+        done = {}
+        if not os.path.exists(self.journal_path):
+            return done
+        with open(self.journal_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    # the last line can be half written if we died mid-write
+                    continue
+                done[entry["chunk"]] = entry
+        return done
+
+    def record(self, chunk_key, issues, cost, tokens, scanned=True):
+        entry = {"chunk": chunk_key, "issues": issues, "cost": cost, "tokens": tokens, "scanned": scanned}
+        self.file.write(json.dumps(entry) + "\n")
+        # make sure it's on disk before we move on, or a crash could lose a chunk we've paid for
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.done[chunk_key] = entry
+
+    def close(self):
+        self.file.close()
+
+    def finish(self):
+        """
+        The run completed, so the journal isn't needed any more
+        """
+        self.close()
+        shutil.rmtree(self.path, ignore_errors=True)
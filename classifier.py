@@ -1,7 +1,10 @@
 import sys
 import json
-from gepetto import gpt, response
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from gepetto import gpt, response, bot_factory
 import logreader
+import verdicts
 from windows_overrides import ignore_list, match_list, replacement_map, regex_ignore_list
 system_prompt = """
 Analyze this system log entry and respond in JSON format with the following:
@@ -31,24 +34,120 @@ Additional guidelines:
 - Log lines which seem unexplained or mysterious should be rated as important so that a human can investigate them.
 """
 
+batch_system_prompt = """
+Analyze each of the numbered system log entries below (each starts with its number in square brackets) and respond in JSON format with the following for every entry:
+1. importance: Rate importance from 0-10 where:
+   - 0-2: Routine/noise (e.g., successful service starts, routine USB connections)
+   - 3-5: Minor issues or warnings
+   - 6-8: Significant issues requiring attention
+   - 9-10: Critical issues requiring immediate action
+2. reason: Brief explanation of the rating
+3. suggested_regex: A simple Python regex pattern to match similar log entries (or null if not appropriate).  The regex will be used to filter the log
+entries by our log filtering system so should be as simple as possible - you can ignore things like timestamps, hostnames, PID's etc.  Think more '<service>.+<some_other_text>' rather than '^\\d{{4}}-\\d{{2}}-\\d{{2}} \\d{{2}}:\\d{{2}}:\\d{{2}} <hostname> <service> .+'
+4. category: One of [noise, warning, error, security, performance, hardware, network, other]
+5. confidence: How sure you are of the category, from 0.0 to 1.0
+
+Log entries to analyze:
+{lines}
+
+Respond only with valid JSON matching this structure, with one classification per entry:
+{{
+    "classifications": [
+        {{
+            "id": <entry number>,
+            "importance": <0-10>,
+            "reason": "<explanation>",
+            "suggested_regex": "<regex or null>",
+            "category": "<category>",
+            "confidence": <0.0-1.0>
+        }}
+    ]
+}}
+
+Additional guidelines:
+- Log lines which seem unexplained or mysterious should be rated as important so that a human can investigate them.
+"""
+
 def classify_log_line(line: str, bot: gpt.GPTModelSync) -> response.ChatResponse:
-    llm_response = bot.chat(messages=[{"role": "user", "content": system_prompt.format(line=line)}], json_format=True)
+    llm_response = bot_factory.call_chat(bot, [{"role": "user", "content": system_prompt.format(line=line)}], json_format=True)
     return llm_response
 
+def group_by_template(lines: list[str], normalise_map: list = []) -> dict[str, list[str]]:
+    # templates are keyed without the hostname, so a message from many hosts is classified (and stored) once
+    templates = {}
+    for line in lines:
+        template = logreader.template_message(logreader.normalize_log_line(line, normalise_map), line)
+        templates.setdefault(template, []).append(line)
+    return templates
+
+def classify_batch(example_lines: list[str], bot: gpt.GPTModelSync) -> tuple[dict[int, dict], float]:
+    numbered_lines = "\n".join(f"[{id + 1}] {line}" for id, line in enumerate(example_lines))
+    llm_response = bot_factory.call_chat(bot, [{"role": "user", "content": batch_system_prompt.format(lines=numbered_lines)}], json_format=True)
+    message = llm_response.message.replace("```json", "").replace('```', '').strip()
+    try:
+        classifications = json.loads(message)["classifications"]
+    except (json.JSONDecodeError, KeyError) as e:
+        print(f"Error: Failed to parse JSON from response: {message}\n\n{e}", file=sys.stderr)
+        return {}, llm_response.cost
+    results = {}
+    for classification in classifications:
+        try:
+            results[int(classification["id"]) - 1] = classification
+        except (KeyError, TypeError, ValueError):
+            continue
+    return results, llm_response.cost
+
+def classify_log_lines(lines: list[str], bot: gpt.GPTModelSync, normalise_map: list = [], batch_size: int = 25, concurrency: int = 8, skip_templates = ()) -> tuple[dict[str, dict], float]:
+    """
+    Classify log lines by collapsing them to their normalised templates and sending one example line per
+    template to the LLM in batches, several batches at a time.  Templates in skip_templates (eg, ones
+    already in the verdict store) are not sent.  Returns a dict of template -> classification (with the
+    example line and all the member lines attached) and the total cost.
+    """
+    templates = group_by_template(lines, normalise_map)
+    template_keys = [template for template in templates.keys() if template not in skip_templates]
+    batches = [template_keys[i:i+batch_size] for i in range(0, len(template_keys), batch_size)]
+    print(f"Classifying {len(lines)} lines as {len(template_keys)} templates in {len(batches)} requests", file=sys.stderr)
+
+    def run_batch(batch):
+        return classify_batch([templates[template][0] for template in batch], bot)
+
+    classified = {}
+    total_cost = 0
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for batch, (results, cost) in zip(batches, executor.map(run_batch, batches)):
+            total_cost += cost
+            for id, template in enumerate(batch):
+                if id not in results:
+                    print(f"Warning: no classification returned for {templates[template][0]}", file=sys.stderr)
+                    continue
+                classification = results[id]
+                classification["original_line"] = templates[template][0]
+                classification["lines"] = templates[template]
+                classified[template] = classification
+    return classified, total_cost
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verdict-store", type=str, required=False, default=verdicts.default_store_path)
+    parser.add_argument("--reclassify", action="store_true", required=False, default=False)
+    args = parser.parse_args()
     bot = gpt.GPTModelSync(model=gpt.Model.GPT_4_OMNI_MINI.value[0])
 
     lines = logreader.read_logfile(sys.stdin, ignore_list, match_list, replacement_map, regex_ignore_list)
     noise_regex = []
-    for line in lines:
-        chat_response = classify_log_line(line, bot)
-        print(chat_response.message)
-        message = chat_response.message.replace("```json", "").replace('```', '').strip()
-        try:
-            decoded = json.loads(message)
-            if decoded["category"] == "noise":
-                noise_regex.append(decoded["suggested_regex"])
-        except json.JSONDecodeError:
-            print(f"Boo", file=sys.stderr)
+    stored_verdicts = verdicts.load_verdicts(args.verdict_store)
+    known_templates = set() if args.reclassify else set(stored_verdicts.keys())
+    classified, cost = classify_log_lines(lines, bot, skip_templates=known_templates)
+    verdicts.touch_verdicts(stored_verdicts, known_templates & set(group_by_template(lines).keys()))
+    verdicts.record_verdicts(stored_verdicts, classified)
+    verdicts.save_verdicts(stored_verdicts, args.verdict_store)
+    for classification in classified.values():
+        member_lines = classification.pop("lines")
+        classification["matching_lines"] = len(member_lines)
+        print(json.dumps(classification, indent=4))
+        if classification.get("category") == "noise" and classification.get("suggested_regex") and classification["suggested_regex"] not in noise_regex:
+            noise_regex.append(classification["suggested_regex"])
     for reg in noise_regex:
         print(f"r'{reg}'")
+    print(f"Cost: US${cost:.3f}", file=sys.stderr)
@@ -0,0 +1,121 @@
+import os
+import re
+import sys
+import pickle
+import hashlib
+import importlib.util
+from types import SimpleNamespace
+import logreader
+import patterncheck
+
+default_cache_dir = ".config_cache"
+# bump this whenever the shape of the compiled config changes so old caches are ignored
+cache_version = 4
+
+prompt_attributes = ["log_scan_prompt", "resolution_prompt", "log_merge_prompt"]
+
+def module_path(module_name):
+    """
+    The file a config module would be imported from, without importing it
+    """
+    try:
+        spec = importlib.util.find_spec(module_name)
+    except (ImportError, ValueError):
+        return None
+    if spec is None or spec.origin is None or not os.path.exists(spec.origin):
+        return None
+    return spec.origin
+
+def cache_key(source_files):
+    """
+    A key that changes whenever any of the files the config was built from changes (or appears/disappears)
+    """
+    parts = [str(cache_version), sys.version]
+    for path in source_files:
+        try:
+            stat = os.stat(path)
+            parts.append(f"{os.path.abspath(path)}:{stat.st_mtime_ns}:{stat.st_size}")
+        except OSError:
+            parts.append(f"{path}:missing")
+    return hashlib.sha1("\n".join(parts).encode()).hexdigest()
+
+def cache_path(cache_dir, source_files):
+    return os.path.join(cache_dir, f"config-{cache_key(source_files)}.pickle")
+
+def load_cached_config(cache_dir, source_files):
+    path = cache_path(cache_dir, source_files)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "rb") as f:
+            return pickle.load(f)
+    except Exception as e:
+        print(f"Warning: Ignoring unreadable config cache {path}: {e}", file=sys.stderr)
+        return None
+
+def save_cached_config(config, cache_dir, source_files):
+    path = cache_path(cache_dir, source_files)
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        # old entries are for config files that have since changed, so they'll never be used again
+        for name in os.listdir(cache_dir):
+            if name.startswith("config-") and name.endswith(".pickle"):
+                os.remove(os.path.join(cache_dir, name))
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "wb") as f:
+            pickle.dump(config, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+    except OSError as e:
+        print(f"Warning: Failed to write config cache {path}: {e}", file=sys.stderr)
+
+def config_error(message):
+    print(f"Error: Invalid config - {message}", file=sys.stderr)
+    sys.exit(1)
+
+def compile_regex(pattern, name):
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    if not isinstance(pattern, str):
+        config_error(f"{name} entry {pattern!r} is not a string")
+    try:
+        return re.compile(pattern)
+    except re.error as e:
+        config_error(f"{name} entry {pattern!r} is not a valid regex: {e}")
+
+def compile_config(config):
+    """
+    Check a merged config module and turn it into a plain namespace with every regex compiled and the
+    lists de-duplicated (keeping their order), ready to be cached.
+    """
+    compiled = SimpleNamespace()
+    for name in ["ignore_list", "match_list"]:
+        values = list(getattr(config, name, []))
+        for value in values:
+            if not isinstance(value, str):
+                config_error(f"{name} entry {value!r} is not a string")
+        setattr(compiled, name, list(dict.fromkeys(values)))
+    compiled.regex_ignore_list = list(dict.fromkeys(compile_regex(pattern, "regex_ignore_list") for pattern in getattr(config, "regex_ignore_list", [])))
+    normalise_map = []
+    for entry in getattr(config, "normalise_map", []):
+        if not isinstance(entry, (tuple, list)) or len(entry) != 2 or not isinstance(entry[1], str):
+            config_error(f"normalise_map entry {entry!r} should be a (pattern, replacement) pair")
+        normalise_map.append((compile_regex(entry[0], "normalise_map"), entry[1]))
+    compiled.normalise_map = list(dict.fromkeys(normalise_map))
+    replacement_map = dict(getattr(config, "replacement_map", {}))
+    for key, value in replacement_map.items():
+        if not isinstance(key, str) or not isinstance(value, str):
+            config_error(f"replacement_map entry {key!r}: {value!r} should map a string to a string")
+    compiled.replacement_map = replacement_map
+    for name in prompt_attributes:
+        prompt = getattr(config, name, None)
+        if not isinstance(prompt, str):
+            config_error(f"{name} is missing or not a string")
+        setattr(compiled, name, prompt)
+    # only needed for --triage-model, so older configs without it still load
+    compiled.triage_prompt = getattr(config, "triage_prompt", None)
+    if compiled.triage_prompt is not None and not isinstance(compiled.triage_prompt, str):
+        config_error("triage_prompt is not a string")
+    compiled.severity_keywords = dict(getattr(config, "severity_keywords", logreader.default_severity_keywords))
+    # kept with the config so they're shown on every run, not just the one that compiled it
+    compiled.pattern_warnings = patterncheck.pattern_warnings(compiled)
+    return compiled
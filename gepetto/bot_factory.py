@@ -1,16 +1,112 @@
-from gepetto import anyscale, gpt, ollama, groq, claude
+import time
+import inspect
+import importlib
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+def _backend(name):
+    # vendor SDKs are slow to import (google-generativeai especially), so only load the one we need
+    return importlib.import_module(f"gepetto.{name}")
 
 def get_bot(model="gpt-4o", vendor="unknown"):
     if model.startswith('gpt'):
-        bot = gpt.GPTModelSync(model=model)
+        bot = _backend("gpt").GPTModelSync(model=model)
     elif model.startswith('claude'):
-        bot = claude.ClaudeModelSync(model=model)
+        bot = _backend("claude").ClaudeModelSync(model=model)
+    elif model.startswith('gemini'):
+        bot = _backend("gemini").GeminiModelSync()
+        bot.model = model
     elif vendor.startswith('ollama'):
-        bot = ollama.OllamaModelSync(model=model)
+        bot = _backend("ollama").OllamaModelSync(model=model)
     elif vendor.startswith('groq'):
-        bot = groq.GroqModelSync(model=model)
+        bot = _backend("groq").GroqModelSync(model=model)
     elif vendor.startswith('anyscale'):
-        bot = anyscale.MistralModelSync(model=model)
+        bot = _backend("anyscale").AnyscaleModelSync(model=model)
     else:
         raise ValueError(f"Cannot find a bot for : {model} / {vendor}")
     return bot
+
+def call_chat(bot, messages, **kwargs):
+    # the backends don't all take the same options (eg, claude has no json_format), so drop any it doesn't know
+    parameters = inspect.signature(bot.chat).parameters
+    if any(parameter.kind == inspect.Parameter.VAR_KEYWORD for parameter in parameters.values()):
+        # a wrapper like HedgedBot - it filters them itself
+        return bot.chat(messages, **kwargs)
+    return bot.chat(messages, **{name: value for name, value in kwargs.items() if name in parameters})
+
+class HedgedBot():
+    """
+    Wraps a primary and secondary bot.  Each chat goes to the primary, and if it hasn't answered within the
+    given percentile of its recent response times a duplicate is sent to the secondary - whichever answers
+    first is used.  The requests are blocking HTTP calls so the slower one can't be stopped; its answer is
+    thrown away when it arrives, and its cost is counted in stats["hedge_cost"].
+    """
+    def __init__(self, primary, secondary, secondary_model=None, percentile=0.95, min_samples=10, initial_delay=10.0, history=200, max_workers=16):
+        self.primary = primary
+        self.secondary = secondary
+        self.secondary_model = secondary_model or getattr(secondary, "model", None)
+        self.model = getattr(primary, "model", None)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.initial_delay = initial_delay
+        self.latencies = deque(maxlen=history)
+        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.lock = threading.Lock()
+        self.stats = {"requests": 0, "hedged": 0, "secondary_won": 0, "hedge_cost": 0.0}
+
+    def hedge_delay(self):
+        with self.lock:
+            if len(self.latencies) < self.min_samples:
+                return self.initial_delay
+            latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * self.percentile), len(latencies) - 1)]
+
+    def _timed_primary(self, messages, kwargs):
+        start_time = time.monotonic()
+        response = call_chat(self.primary, messages, **kwargs)
+        with self.lock:
+            self.latencies.append(time.monotonic() - start_time)
+        return response
+
+    def _count_loser(self, future):
+        if not future.cancelled() and future.exception() is None:
+            with self.lock:
+                self.stats["hedge_cost"] += future.result().cost
+
+    def chat(self, messages, **kwargs):
+        with self.lock:
+            self.stats["requests"] += 1
+        primary = self.executor.submit(self._timed_primary, messages, kwargs)
+        done, _ = wait([primary], timeout=self.hedge_delay())
+        if done and primary.exception() is None:
+            return primary.result()
+        # the primary is slow (or failed), so race it against the secondary
+        with self.lock:
+            self.stats["hedged"] += 1
+        secondary = self.executor.submit(call_chat, self.secondary, messages, **dict(kwargs, model=self.secondary_model))
+        pending = {primary, secondary}
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is not None:
+                    continue
+                for loser in pending:
+                    loser.cancel()
+                    loser.add_done_callback(self._count_loser)
+                if future is secondary:
+                    with self.lock:
+                        self.stats["secondary_won"] += 1
+                return future.result()
+        raise primary.exception()
+
+    def stats_summary(self):
+        stats = self.stats
+        if stats["requests"] == 0:
+            return "Hedging: no requests made"
+        return (f"Hedging: sent a duplicate to {self.secondary_model} for {stats['hedged']} of {stats['requests']} requests "
+                f"({stats['hedged'] / stats['requests'] * 100:.1f}%), it answered first {stats['secondary_won']} times, "
+                f"extra cost US${stats['hedge_cost']:.3f}")
+
+def get_hedged_bot(model, hedge_model, percentile=0.95, vendor="unknown", hedge_vendor="unknown"):
+    return HedgedBot(get_bot(model, vendor), get_bot(hedge_model, hedge_vendor), hedge_model, percentile)
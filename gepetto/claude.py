@@ -69,7 +69,9 @@ class ClaudeModel():
         tokens = response.usage.input_tokens + response.usage.output_tokens
         cost = self.get_token_price(tokens, "output", model) + self.get_token_price(response.usage.input_tokens, "input", model)
         message = str(response.content[0].text)
-        return ChatResponse(message, tokens, cost, model)
+        # use the same name as openai for a reply cut short by max_tokens
+        finish_reason = "length" if response.stop_reason == "max_tokens" else response.stop_reason
+        return ChatResponse(message, tokens, cost, model, finish_reason)
 
     async def function_call(self, messages = [], tools = [], temperature=0.7, model="mistralai/Mistral-7B-Instruct-v0.1"):
         raise NotImplementedError
@@ -132,7 +134,9 @@ class ClaudeModelSync():
         tokens = response.usage.input_tokens + response.usage.output_tokens
         cost = self.get_token_price(tokens, "output", model) + self.get_token_price(response.usage.input_tokens, "input", model)
         message = str(response.content[0].text)
-        return ChatResponse(message, tokens, cost, model)
+        # use the same name as openai for a reply cut short by max_tokens
+        finish_reason = "length" if response.stop_reason == "max_tokens" else response.stop_reason
+        return ChatResponse(message, tokens, cost, model, finish_reason)
 
     def function_call(self, messages = [], tools = [], temperature=0.7, model="mistralai/Mistral-7B-Instruct-v0.1"):
         raise NotImplementedError
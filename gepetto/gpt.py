@@ -62,7 +62,7 @@ class GPTModel():
         else:
             format = {"type": "text"}
         api_key = os.getenv("OPENAI_API_KEY")
-        api_base = "https://api.openai.com/v1/"
+        api_base = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1/")
         client = OpenAI(api_key=api_key, base_url=api_base)
         response = client.chat.completions.create(
             model=model,
@@ -79,13 +79,13 @@ class GPTModel():
         input_cost = self.get_token_price(input_tokens, "input", model)
         cost = input_cost + output_cost
         message = str(response.choices[0].message.content)
-        return ChatResponse(message, tokens, cost, model)
+        return ChatResponse(message, tokens, cost, model, response.choices[0].finish_reason)
 
     async def function_call(self, messages = [], tools = [], temperature=0.7, model=None):
         if model is None:
             model = self.model
         api_key = os.getenv("OPENAI_API_KEY")
-        api_base = "https://api.openai.com/v1/"
+        api_base = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1/")
         client = OpenAI(api_key=api_key, base_url=api_base)
         response = client.chat.completions.create(
             model=model,
@@ -143,7 +143,7 @@ class GPTModelSync():
             format = {"type": "text"}
 
         api_key = os.getenv("OPENAI_API_KEY")
-        api_base = "https://api.openai.com/v1/"
+        api_base = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1/")
         client = OpenAI(api_key=api_key, base_url=api_base)
         response = client.chat.completions.create(
             model=model,
@@ -159,13 +159,13 @@ class GPTModelSync():
         input_cost = self.get_token_price(input_tokens, "input", model)
         cost = input_cost + output_cost
         message = str(response.choices[0].message.content)
-        return ChatResponse(message, tokens, cost, model)
+        return ChatResponse(message, tokens, cost, model, response.choices[0].finish_reason)
 
     def function_call(self, messages = [], tools = [], temperature=0.7, model=None):
         if model is None:
             model = self.model
         api_key = os.getenv("OPENAI_API_KEY")
-        api_base = "https://api.openai.com/v1/"
+        api_base = os.getenv("OPENAI_BASE_URL", "https://api.openai.com/v1/")
         client = OpenAI(api_key=api_key, base_url=api_base)
         response = client.chat.completions.create(
             model=model,
@@ -30,7 +30,7 @@ class OllamaModel():
         if model is None:
             model = self.model
         client = OpenAI(
-            base_url = 'http://host.docker.internal:11434/v1',
+            base_url = os.getenv("OLLAMA_BASE_URL", 'http://host.docker.internal:11434/v1'),
             api_key='ollama', # required, but unused
         )
         response = client.chat.completions.create(
@@ -43,7 +43,7 @@ class OllamaModel():
         tokens = input_tokens + output_tokens
         cost = 0
         message = str(response.choices[0].message.content)
-        return ChatResponse(message, tokens, cost, model)
+        return ChatResponse(message, tokens, cost, model, response.choices[0].finish_reason)
 
     async def function_call(self, messages = [], tools = [], temperature=0.7, model="mistralai/Mistral-7B-Instruct-v0.1"):
         raise NotImplementedError
@@ -55,7 +55,7 @@ class OllamaModelSync():
         if model is None:
             self.model = "dolphin-mistral"
         else:
-            self.model
+            self.model = model
 
     def get_token_price(self, token_count, direction="output", model_engine=None):
         return 0
@@ -75,7 +75,7 @@ class OllamaModelSync():
         if model is None:
             model = self.model
         client = OpenAI(
-            base_url = 'http://localhost:11434/v1',
+            base_url = os.getenv("OLLAMA_BASE_URL", 'http://localhost:11434/v1'),
             api_key='ollama', # required, but unused
         )
         response = client.chat.completions.create(
@@ -88,7 +88,7 @@ class OllamaModelSync():
         tokens = input_tokens + output_tokens
         cost = 0
         message = str(response.choices[0].message.content)
-        return ChatResponse(message, tokens, cost, model)
+        return ChatResponse(message, tokens, cost, model, response.choices[0].finish_reason)
 
     def function_call(self, messages = [], tools = [], temperature=0.7, model=None):
         raise NotImplementedError
@@ -8,12 +8,14 @@ class ChatResponse:
         tokens (int): The number of tokens used.
         cost (float): The estimated cost of the request in USD.
         model (str): The model used to generate the response.
+        finish_reason (str): Why the model stopped, if the backend says - "length" means the reply was cut off.
     """
-    def __init__(self, message, tokens, cost, model="Unknown"):
+    def __init__(self, message, tokens, cost, model="Unknown", finish_reason=None):
         self.message = message
         self.tokens = tokens
         self.cost = cost
         self.model = model
+        self.finish_reason = finish_reason
         self.usage = f"_[Tokens used: {self.tokens} | Estimated cost US${round(self.cost, 5)}] | Model: {model}_"
 
     def __str__(self):
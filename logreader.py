@@ -1,28 +1,121 @@
 import re
 import sys
 import io
+import os
+import bz2
+import glob
+import gzip
+import lzma
+import time
+import queue
+import random
+import functools
+import threading
+from array import array
 from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+try:
+    import numpy
+except ImportError:
+    numpy = None
+try:
+    import orjson
+    json_loads = orjson.loads
+except ImportError:
+    import json
+    json_loads = json.loads
+from datetime import date, datetime, timedelta
+
+class JournalLine(str):
+    """
+    A log line built from a structured source (a `journalctl -o json` record or a message from the syslog
+    receiver).  It reads like a normal syslog line, but also carries the fields we were given so normalising
+    and scoring don't need to parse the line header.
+    """
+    def __new__(cls, text, hostname, body, priority=None):
+        line = super().__new__(cls, text)
+        line.hostname = hostname
+        line.body = body
+        line.priority = priority
+        return line
+
+    def __reduce__(self):
+        return (JournalLine, (str(self), self.hostname, self.body, self.priority))
+
+    def replace_text(self, old, new):
+        return JournalLine(str.replace(self, old, new), self.hostname.replace(old, new), self.body.replace(old, new), self.priority)
+
+month_names = ("Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
+@functools.lru_cache(maxsize=4096)
+def _journal_timestamp(seconds):
+    moment = time.localtime(seconds)
+    return f"{month_names[moment.tm_mon - 1]} {moment.tm_mday:>2} {moment.tm_hour:02d}:{moment.tm_min:02d}:{moment.tm_sec:02d}"
+
+def _journal_field(fields, name):
+    value = fields.get(name)
+    # the journal sends non-UTF8 fields as arrays of byte values
+    if value.__class__ is list:
+        return bytes(value).decode("utf8", errors="ignore")
+    return value
+
+def parse_journal_record(record):
+    """
+    Turn one line of `journalctl -o json` output into a JournalLine, or None if it isn't a usable record
+    """
+    try:
+        fields = json_loads(record)
+    except ValueError:
+        return None
+    if fields.__class__ is not dict:
+        return None
+    message = _journal_field(fields, "MESSAGE")
+    if not message:
+        return None
+    hostname = fields.get("_HOSTNAME") or "UNKNOWN_HOST"
+    identifier = fields.get("SYSLOG_IDENTIFIER") or fields.get("_COMM") or "unknown"
+    pid = fields.get("SYSLOG_PID") or fields.get("_PID")
+    body = f"{identifier}[{pid}]: {message}" if pid else f"{identifier}: {message}"
+    try:
+        timestamp = _journal_timestamp(int(fields["__REALTIME_TIMESTAMP"]) // 1000000)
+    except (KeyError, TypeError, ValueError):
+        timestamp = ""
+    priority = fields.get("PRIORITY")
+    if priority is not None:
+        priority = int(priority) if str(priority).isdigit() else None
+    return JournalLine(f"{timestamp} {hostname} {body}".strip(), hostname, body, priority)
 
 def normalize_log_line(line, normalise_map):
     normalized_line = line
 
     # Normalise the line using the local normalise_map - return early if a match/replacement is done
     for pattern, replacement in normalise_map:
-        if re.search(pattern, normalized_line):
-            return replacement
+        match = re.search(pattern, normalized_line) if isinstance(pattern, str) else pattern.search(normalized_line)
+        if match:
+            # replacements can use the pattern's groups (eg, r"\1" to keep the hostname)
+            return match.expand(replacement) if '\\' in replacement else replacement
 
-    # Remove timestamps at the start - handles both traditional syslog and systemd journal formats
-    normalized_line = re.sub(
-        r'^(?:\w{3}\s+\d+\s+\d{2}:\d{2}:\d{2}|'
-        r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+[+-]\d{2}:\d{2})',
-        '',
-        line
-    ).strip()
+    if isinstance(line, JournalLine):
+        # journal records already have the hostname split out, so skip the header parsing
+        hostname = line.hostname
+        normalized_line = line.body
+    else:
+        # Remove timestamps at the start - handles both traditional syslog and systemd journal formats
+        normalized_line = re.sub(
+            r'^(?:\w{3}\s+\d+\s+\d{2}:\d{2}:\d{2}|'
+            r'\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+[+-]\d{2}:\d{2})',
+            '',
+            line
+        ).strip()
 
-    # Extract hostname
-    match = re.match(r'^(\S+)', normalized_line)
-    hostname = match.group(1) if match else 'UNKNOWN_HOST'
-    normalized_line = normalized_line[len(hostname):].strip()
+        # Extract hostname
+        match = re.match(r'^(\S+)', normalized_line)
+        hostname = match.group(1) if match else 'UNKNOWN_HOST'
+        normalized_line = normalized_line[len(hostname):].strip()
 
     # Remove process IDs in square brackets
     normalized_line = re.sub(r'\[\d+\]', '[]', normalized_line)
@@ -227,42 +320,751 @@ def normalize_log_line(line, normalise_map):
     # Return the normalized line with the hostname
     return f'{hostname} {normalized_line}'
 
-def filter_duplicate_logs(log_lines, max_occurrences=3, normalise_map=[]):
+# rough weights for words which tend to mean a line matters - used to decide what gets scanned first
+default_severity_keywords = {
+    "panic": 10,
+    "segfault": 8,
+    "oom": 8,
+    "out of memory": 8,
+    "critical": 6,
+    "fatal": 6,
+    "denied": 5,
+    "failed": 4,
+    "failure": 4,
+    "error": 4,
+    "timed out": 3,
+    "refused": 3,
+    "warning": 1,
+}
+syslog_priority_regex = re.compile(r'^<(\d{1,3})>')
+
+@functools.lru_cache(maxsize=256)
+def severity_keyword_regex(keyword):
+    """
+    Finds the keyword as a whole word in a lowercased line, so "oom" isn't found in "room" - a plural and a
+    trailing _ or - are allowed, as in "errors", "oom_reaper" and "oom-killer"
+    """
+    return re.compile(rf'(?<![a-z0-9]){re.escape(keyword.lower())}s?(?![a-z0-9])')
+
+def has_severity_keyword(lower_line, keyword):
+    # the substring test rules out nearly every line before the regex has to run
+    return keyword in lower_line and severity_keyword_regex(keyword).search(lower_line) is not None
+
+def score_log_line(line, severity_keywords=default_severity_keywords):
+    """
+    A cheap importance score for a line - the syslog severity from an RFC 5424/3164 <PRI> prefix if there
+    is one (emerg scores 14, debug 0) plus the weights of any keywords found in it.
+    """
+    score = 0
+    severity = getattr(line, "priority", None)
+    if severity is None:
+        match = syslog_priority_regex.match(line)
+        if match:
+            severity = int(match.group(1)) % 8
+    if severity is not None:
+        score += (7 - severity) * 2
+    lower_line = line.lower()
+    for keyword, weight in severity_keywords.items():
+        if has_severity_keyword(lower_line, keyword):
+            score += weight
+    return score
+
+def filter_duplicate_logs(log_lines, max_occurrences=3, normalise_map=[], with_scores=False, severity_keywords=default_severity_keywords, template_counts=None, line_templates=None, rates=None):
+    """
+    Drop lines whose normalised form has already been seen max_occurrences times.  With with_scores=True the
+    severity score of each kept line is worked out in the same pass and (lines, scores) is returned.
+    If a template_counts dict is passed in it is filled with the total count of every template (including
+    the dropped lines), and a line_templates list gets the template of each kept line.  A TemplateRates
+    passed as rates gets every line added to its per-minute counts.
+    """
     occurrence_dict = defaultdict(int)
     filtered_logs = []
+    scores = []
 
     for line in log_lines:
         normalized_line = normalize_log_line(line, normalise_map)
+        if template_counts is not None:
+            template_counts[normalized_line] = template_counts.get(normalized_line, 0) + 1
+        if rates is not None:
+            rates.add(normalized_line, line)
 
         if occurrence_dict[normalized_line] < max_occurrences:
             filtered_logs.append(line)
             occurrence_dict[normalized_line] += 1
-    # final removal of some token-heavy lines
-    for line in filtered_logs:
+            if with_scores:
+                scores.append(score_log_line(line, severity_keywords))
+            if line_templates is not None:
+                line_templates.append(normalized_line)
+    # final removal of some token-heavy lines - replaced in place so the scores stay lined up
+    for index, line in enumerate(filtered_logs):
         if re.search(r'snap.+store.+error', line):
-            filtered_logs.remove(line)
-            truncated_line = line[:100] + "..."
-            filtered_logs.append(truncated_line)
+            filtered_logs[index] = line[:100] + "..."
+    if with_scores:
+        return filtered_logs, scores
     return filtered_logs
 
-def read_logfile(file, ignore_list, match_list, replacement_map, regex_ignore_list = []) -> list[str]:
-    if file == sys.stdin:
-        stdin_wrapper = io.TextIOWrapper(sys.stdin.buffer, encoding="utf8", errors='ignore')
-        lines = stdin_wrapper.read().splitlines()
+def severity_chunks(lines, scores, line_chunk_size=1000):
+    """
+    Pack lines into chunks so the highest scoring lines are in the first chunks.  Lines within each chunk are
+    kept in their original order so the LLM still sees them chronologically.
+    """
+    ranked = sorted(range(len(lines)), key=lambda index: scores[index], reverse=True)
+    chunks = []
+    for i in range(0, len(ranked), line_chunk_size):
+        chunks.append([lines[index] for index in sorted(ranked[i:i+line_chunk_size])])
+    return chunks
+
+def line_stratum(line, template):
+    """
+    The (host, template) a line belongs to - the template without its hostname, so it's the same for every host
+    """
+    return line_hostname(line), template_message(template, line)
+
+def stratified_sample(lines, line_templates, template_counts, char_budget, scores=None, severity_keywords=default_severity_keywords, keep_score=8, rare_count=1, rare_share=0.5, seed=0, min_line_chars=20):
+    """
+    Pick a sample of lines that fits in char_budget characters, in one pass.  Lines scoring at least keep_score
+    are always kept, and so are lines of templates seen no more than rare_count times in the whole log - as long
+    as they fit in rare_share of the budget (if almost everything is rare, rarity doesn't tell us anything).
+    Everything else goes into a reservoir per (host, template) - a uniform sample of that stratum, no bigger than
+    the budget could hold of min_line_chars lines - and at the end the budget that's left is dealt out a line at
+    a time to each stratum in turn, so small strata are kept whole and the noisiest ones are sampled hardest.
+    The seed is fixed so the same input always gives the same sample (which --resume needs).  Returns the
+    indexes of the kept lines in their original order, and per-stratum counts.
+    """
+    rng = random.Random(seed)
+    keep = []
+    kept_chars = 0
+    rare = []
+    rare_chars = 0
+    reservoirs = {}
+    strata = {}
+    line_strata = []
+    reservoir_size = char_budget // min_line_chars + 1
+    for index, (line, template) in enumerate(zip(lines, line_templates)):
+        stratum = line_stratum(line, template)
+        line_strata.append(stratum)
+        counts = strata.setdefault(stratum, {"seen": 0, "kept": 0, "always": 0})
+        counts["seen"] += 1
+        score = scores[index] if scores is not None else score_log_line(line, severity_keywords)
+        if score >= keep_score:
+            keep.append(index)
+            kept_chars += len(line) + 1
+            counts["kept"] += 1
+            counts["always"] += 1
+            continue
+        if template_counts.get(template, 0) <= rare_count:
+            rare.append(index)
+            rare_chars += len(line) + 1
+        # algorithm R, per stratum
+        reservoir = reservoirs.setdefault(stratum, [0, []])
+        reservoir[0] += 1
+        if len(reservoir[1]) < reservoir_size:
+            reservoir[1].append(index)
+        else:
+            slot = rng.randrange(reservoir[0])
+            if slot < reservoir_size:
+                reservoir[1][slot] = index
+    if kept_chars > char_budget:
+        print(f"Warning: the high severity lines alone are over the token budget", file=sys.stderr)
+    taken = set()
+    if rare_chars <= char_budget * rare_share:
+        for index in rare:
+            strata[line_strata[index]]["kept"] += 1
+            strata[line_strata[index]]["always"] += 1
+        keep.extend(rare)
+        kept_chars += rare_chars
+        taken = set(rare)
+    else:
+        print(f"Sampling: {len(rare)} lines have rare templates, too many to keep them all", file=sys.stderr)
+    remaining = max(char_budget - kept_chars, 0)
+    # deal the rest of the budget out a line per stratum per round, in a random order so that when there are
+    # more strata than lines to spare, which strata miss out is down to chance rather than their size
+    samples = []
+    for stratum, (_, sample) in reservoirs.items():
+        sample = [index for index in sample if index not in taken]
+        if sample:
+            rng.shuffle(sample)
+            samples.append((stratum, sample))
+    rng.shuffle(samples)
+    position = 0
+    while samples and remaining > 0:
+        still_sampling = []
+        for stratum, sample in samples:
+            index = sample[position]
+            if len(lines[index]) + 1 > remaining:
+                continue
+            keep.append(index)
+            remaining -= len(lines[index]) + 1
+            strata[stratum]["kept"] += 1
+            if position + 1 < len(sample):
+                still_sampling.append((stratum, sample))
+        samples = still_sampling
+        position += 1
+    keep.sort()
+    return keep, strata
+
+def sampling_to_report(strata, limit=20):
+    """
+    The sampling rate of the most heavily sampled strata, so readers know what the scan didn't see
+    """
+    seen = sum(counts["seen"] for counts in strata.values())
+    kept = sum(counts["kept"] for counts in strata.values())
+    always = sum(counts["always"] for counts in strata.values())
+    report = f"Scanned a sample of {kept} of {seen} lines ({kept / max(seen, 1) * 100:.1f}%) - {always} high severity or rare lines were always kept, the rest were sampled per host and template.\n\n"
+    sampled = sorted(((stratum, counts) for stratum, counts in strata.items() if counts["kept"] < counts["seen"]), key=lambda item: (item[1]["kept"] / item[1]["seen"], -item[1]["seen"]))
+    for (host, template), counts in sampled[:limit]:
+        report += f"- {host} `{template[:100]}`: {counts['kept']} of {counts['seen']} lines ({counts['kept'] / counts['seen'] * 100:.1f}%)\n"
+    if len(sampled) > limit:
+        report += f"- ...and {len(sampled) - limit} more sampled hosts/templates\n"
+    return report
+
+minute_prefix_regex = re.compile(r'^(?:(\w{3})\s+(\d+)\s(\d{2}):(\d{2})|(\d{4})-(\d{2})-(\d{2})T(\d{2}):(\d{2}))')
+
+class TemplateRates():
+    """
+    Per-template counts of lines per minute, kept in compact array('I') buckets.  Templates only get a bucket
+    array once they have been seen spike_count times, as anything rarer can't be a spike.  spikes() reads the
+    buckets with numpy if it's installed, and falls back to the builtins (which also run in C) if not.
+    """
+    def __init__(self, spike_count=50):
+        self.spike_count = spike_count
+        self.totals = {}
+        self.early_minutes = {}
+        self.buckets = {}
+        self.first_minute = {}
+        self.start_minute = None
+        self.end_minute = None
+        self.minute_cache = {}
+        self.today = date.today()
+
+    def syslog_year(self, month, day):
+        # syslog timestamps have no year, so assume the line is from the last twelve months
+        return self.today.year if (month, day) <= (self.today.month, self.today.day) else self.today.year - 1
+
+    def line_minute(self, line):
+        """
+        The minute a line was logged at, counted from the start of the calendar (so month ends and leap years
+        come out right).  None if the line has no timestamp we understand.
+        """
+        # cut off the seconds so every line in the same minute shares a cache entry
+        key = line[:16] if line[:1].isdigit() else line[:12]
+        minute = self.minute_cache.get(key)
+        if minute is None:
+            match = minute_prefix_regex.match(key)
+            if not match:
+                return None
+            if match.group(1):
+                if match.group(1) not in month_names:
+                    return None
+                month = month_names.index(match.group(1)) + 1
+                day, hour, minute_of_hour = (int(value) for value in match.group(2, 3, 4))
+                year = self.syslog_year(month, day)
+            else:
+                year, month, day, hour, minute_of_hour = (int(value) for value in match.group(5, 6, 7, 8, 9))
+            try:
+                minute = date(year, month, day).toordinal() * 1440 + hour * 60 + minute_of_hour
+            except ValueError:
+                return None
+            if len(self.minute_cache) < 200000:
+                self.minute_cache[key] = minute
+        return minute
+
+    @staticmethod
+    def format_minute(minute):
+        day, minute = divmod(minute, 1440)
+        day = date.fromordinal(day)
+        return f"{month_names[day.month - 1]} {day.day:>2} {minute // 60:02d}:{minute % 60:02d}"
+
+    def add(self, template, line):
+        minute = self.line_minute(line)
+        if minute is None:
+            return
+        if self.start_minute is None or minute < self.start_minute:
+            self.start_minute = minute
+        if self.end_minute is None or minute > self.end_minute:
+            self.end_minute = minute
+        total = self.totals.get(template, 0) + 1
+        self.totals[template] = total
+        if total < self.spike_count:
+            self.early_minutes.setdefault(template, []).append(minute)
+            return
+        if total == self.spike_count:
+            minutes = self.early_minutes.pop(template) + [minute]
+            first_minute = min(minutes)
+            self.first_minute[template] = first_minute
+            self.buckets[template] = array('I', [0]) * (max(minutes) - first_minute + 1)
+            for early_minute in minutes:
+                self._increment(template, early_minute)
+            return
+        self._increment(template, minute)
+
+    def _increment(self, template, minute):
+        buckets = self.buckets[template]
+        offset = minute - self.first_minute[template]
+        if offset < 0:
+            # lines aren't always in order - grow the array backwards
+            buckets[0:0] = array('I', [0]) * -offset
+            self.first_minute[template] = minute
+            offset = 0
+        elif offset >= len(buckets):
+            buckets.extend(array('I', [0]) * (offset - len(buckets) + 1))
+        buckets[offset] += 1
+
+    def spikes(self, factor=10.0):
+        """
+        Templates whose busiest minute had at least spike_count lines and more than factor times their
+        average rate over the whole log.  Returns a dict of template -> spike details, biggest first.
+        """
+        if self.start_minute is None:
+            return {}
+        span = self.end_minute - self.start_minute + 1
+        found = []
+        for template, buckets in self.buckets.items():
+            if numpy is not None:
+                # a view of the array's memory, not a copy
+                counts = numpy.frombuffer(buckets, dtype=numpy.uintc)
+                peak_offset = int(counts.argmax())
+                peak = int(counts[peak_offset])
+            else:
+                counts = buckets
+                peak = max(buckets)
+                peak_offset = buckets.index(peak)
+            average = self.totals[template] / span
+            if peak < self.spike_count or peak < factor * average:
+                continue
+            burst = int(sum(counts[max(peak_offset - 2, 0):peak_offset + 3]))
+            found.append((template, {
+                "total": self.totals[template],
+                "peak_count": peak,
+                "peak_minute": self.format_minute(self.first_minute[template] + peak_offset),
+                "five_minute_count": burst,
+                "average_per_minute": average,
+            }))
+        found.sort(key=lambda item: item[1]["peak_count"], reverse=True)
+        return dict(found)
+
+def annotate_spikes(lines, line_templates, spikes):
+    """
+    Add the rate information to the kept lines of any template which spiked, so the LLM can see it
+    """
+    annotated = []
+    for line, template in zip(lines, line_templates):
+        spike = spikes.get(template)
+        if spike:
+            line = f"{line} [rate: {spike['total']} similar lines, peak {spike['peak_count']}/min at {spike['peak_minute']}, {spike['five_minute_count']} in 5 min]"
+        annotated.append(line)
+    return annotated
+
+def spikes_to_report(spikes, limit=20):
+    report = ""
+    for template, spike in list(spikes.items())[:limit]:
+        report += f"- `{template}`\n"
+        report += f"  - {spike['total']} lines in total, peaking at {spike['peak_count']}/min at {spike['peak_minute']} ({spike['five_minute_count']} in 5 minutes, against an average of {spike['average_per_minute']:.1f}/min)\n"
+    return report
+
+# magic numbers for the compressed formats logrotate can leave behind
+compression_magic = {
+    b"\x1f\x8b": "gzip",
+    b"\xfd7zXZ\x00": "xz",
+    b"BZh": "bz2",
+    b"\x28\xb5\x2f\xfd": "zstd",
+}
+
+def open_compressed(binary_file):
+    """
+    Wrap a binary file object in the right decompressor, based on its first few bytes
+    """
+    header = binary_file.peek(6)[:6] if hasattr(binary_file, "peek") else b""
+    for magic, compression in compression_magic.items():
+        if header.startswith(magic):
+            break
     else:
-        with open(file, 'r', encoding="utf8", errors='ignore') as f:
-            lines = f.read().splitlines()
-
-    # Remove empty lines
-    lines = [line for line in lines if line.strip() != ""]
-
-    if len(ignore_list) > 0:
-        # print(f"Ignoring: {ignore_list}", file=sys.stderr)
-        lines = [line for line in lines if not any(ignore in line for ignore in ignore_list)]
-    if len(regex_ignore_list) > 0:
-        # print(f"Ignoring regex: {regex_ignore_list}", file=sys.stderr)
-        lines = [line for line in lines if not any(re.search(ignore, line) for ignore in regex_ignore_list)]
-    if len(match_list) > 0:
-        lines = [line for line in lines if any(match in line for match in match_list)]
-    lines = [line.replace(k, v) for k, v in replacement_map.items() for line in lines]
+        return binary_file
+    if compression == "gzip":
+        return gzip.GzipFile(fileobj=binary_file)
+    if compression == "xz":
+        return lzma.LZMAFile(binary_file)
+    if compression == "bz2":
+        return bz2.BZ2File(binary_file)
+    if zstandard is None:
+        raise RuntimeError("This log is zstd compressed - pip install zstandard to read it")
+    return io.BufferedReader(zstandard.ZstdDecompressor().stream_reader(binary_file, read_across_frames=True))
+
+def stream_log_lines(file, batch_size=5000, max_batches=8):
+    """
+    Yield the lines of a (possibly compressed) log file or stdin.  The reading and decompressing happens in a
+    background thread which hands over batches of lines through a bounded queue, so it overlaps with whatever
+    the caller does with the lines and at most max_batches batches are held in memory.
+    """
+    batches = queue.Queue(maxsize=max_batches)
+    stop_reading = threading.Event()
+
+    def reader():
+        try:
+            binary_file = sys.stdin.buffer if file == sys.stdin else open(file, "rb")
+            try:
+                text_file = io.TextIOWrapper(open_compressed(binary_file), encoding="utf8", errors="ignore")
+                batch = []
+                for line in text_file:
+                    batch.append(line)
+                    if len(batch) >= batch_size:
+                        batches.put(batch)
+                        batch = []
+                        if stop_reading.is_set():
+                            return
+                batches.put(batch)
+            finally:
+                if file != sys.stdin:
+                    binary_file.close()
+        except Exception as e:
+            batches.put(e)
+        finally:
+            batches.put(None)
+
+    thread = threading.Thread(target=reader, daemon=True)
+    thread.start()
+    try:
+        while True:
+            batch = batches.get()
+            if batch is None:
+                break
+            if isinstance(batch, Exception):
+                raise batch
+            for line in batch:
+                yield line.rstrip("\r\n")
+    finally:
+        # if the caller stops early, let the reader thread finish rather than blocking on a full queue
+        stop_reading.set()
+        while thread.is_alive():
+            try:
+                batches.get(timeout=0.1)
+            except queue.Empty:
+                pass
+
+def _literal_trie_pattern(node):
+    branches = [re.escape(char) + _literal_trie_pattern(child) for char, child in sorted(node.items()) if char != ""]
+    if not branches:
+        return ""
+    pattern = branches[0] if len(branches) == 1 else f"(?:{'|'.join(branches)})"
+    if "" in node:
+        # a shorter literal ends here, so the rest is optional
+        pattern = f"(?:{pattern})?"
+    return pattern
+
+@functools.lru_cache(maxsize=32)
+def literal_matcher(literals):
+    """
+    Compile a tuple of plain substrings into one regex shaped like a trie, so checking a line against
+    hundreds of them is a single search rather than one `in` per substring.  Returns None for no literals.
+    """
+    literals = [literal for literal in literals if literal != ""]
+    if not literals:
+        return None
+    trie = {}
+    for literal in literals:
+        node = trie
+        for char in literal:
+            node = node.setdefault(char, {})
+        node[""] = {}
+    return re.compile(_literal_trie_pattern(trie))
+
+class LiteralPrecheck():
+    """
+    Stands in for a compiled regex that is just literal text joined by .* or .+ (eg, r'php.+already enabled').
+    search() looks for the literals in order with str.find first, and only runs the regex on lines which have
+    them all - most lines fail the cheap check, so the regex engine never starts.  pieces is a list of
+    (literal, the fewest characters that must come before it).
+    """
+    def __init__(self, regex, pieces):
+        self.regex = regex
+        self.pattern = regex.pattern
+        self.pieces = pieces
+
+    def search(self, line):
+        position = 0
+        for literal, gap in self.pieces:
+            position = line.find(literal, position + gap)
+            if position == -1:
+                return None
+            position += len(literal)
+        return self.regex.search(line)
+
+def make_line_filter(ignore_list, match_list, replacement_map, regex_ignore_list = [], noise_model = None, noise_threshold = 0.95):
+    """
+    Build a function which takes a single line and returns it (with the replacement_map applied) if it
+    should be kept, or None if it should be filtered out.
+    """
+    regex_ignore_list = [re.compile(ignore) if isinstance(ignore, str) else ignore for ignore in regex_ignore_list]
+    ignore_matcher = literal_matcher(tuple(ignore_list))
+    match_matcher = literal_matcher(tuple(match_list))
+    replacements = list(replacement_map.items())
+
+    def line_filter(line):
+        # Remove empty lines
+        if line.strip() == "":
+            return None
+        if ignore_matcher is not None and ignore_matcher.search(line):
+            return None
+        if any(ignore.search(line) for ignore in regex_ignore_list):
+            return None
+        if match_matcher is not None and not match_matcher.search(line):
+            return None
+        if noise_model is not None and noise_model.score(line) >= noise_threshold:
+            return None
+        for k, v in replacements:
+            line = line.replace_text(k, v) if isinstance(line, JournalLine) else line.replace(k, v)
+        return line
+
+    return line_filter
+
+def read_logfile(file, ignore_list, match_list, replacement_map, regex_ignore_list = [], noise_model = None, noise_threshold = 0.95, journal = False) -> list[str]:
+    """
+    Read a log file (or stdin), which can be gzip/xz/bz2/zstd compressed, and filter it a line at a time so
+    only the lines we keep are held in memory.  With journal=True the input is `journalctl -o json` output
+    and each record becomes a JournalLine.
+    """
+    line_filter = make_line_filter(ignore_list, match_list, replacement_map, regex_ignore_list, noise_model, noise_threshold)
+    lines = []
+    for line in stream_log_lines(file):
+        if journal:
+            line = parse_journal_record(line)
+            if line is None:
+                continue
+        line = line_filter(line)
+        if line is not None:
+            lines.append(line)
     return lines
+
+def expand_file_args(files):
+    """
+    Expand any globs in the list of --file arguments, keeping the order they were given in
+    """
+    expanded = []
+    for file in files:
+        matches = sorted(glob.glob(file)) if glob.has_magic(file) else [file]
+        for match in matches:
+            if match not in expanded:
+                expanded.append(match)
+    return expanded
+
+def read_logfiles(files, ignore_list, match_list, replacement_map, regex_ignore_list = [], noise_model = None, noise_threshold = 0.95, workers = None, journal = False) -> dict[str, list[str]]:
+    """
+    Read and filter several log files at the same time (one process per file, up to workers).
+    Returns a dict of file -> filtered lines in the order the files were given.
+    """
+    workers = max(workers or min(len(files), os.cpu_count() or 1), 1)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = [
+            executor.submit(read_logfile, file, ignore_list, match_list, replacement_map, regex_ignore_list, noise_model, noise_threshold, journal)
+            for file in files
+        ]
+        return {file: future.result() for file, future in zip(files, futures)}
+
+host_header_regex = re.compile(r'^(?:\w{3}\s+\d+\s+\d{2}:\d{2}:\d{2}|\d{4}-\d{2}-\d{2}T\d{2}:\d{2}:\d{2}\.\d+[+-]\d{2}:\d{2})?\s*(\S+)')
+
+def line_hostname(line):
+    """
+    The hostname of a line, found the same way normalize_log_line does
+    """
+    if isinstance(line, JournalLine):
+        return line.hostname
+    match = host_header_regex.match(line)
+    return match.group(1) if match else 'UNKNOWN_HOST'
+
+def group_by_host(lines):
+    """
+    Split lines into one shard per host, in the order each host first appears so hosts which are packed
+    together in a chunk cover roughly the same time.  Each shard keeps its lines in their original order.
+    """
+    shards = {}
+    for line in lines:
+        shards.setdefault(line_hostname(line), []).append(line)
+    return list(shards.values())
+
+def group_by_shard(lines, shard_of_line):
+    """
+    Split lines back into their shards (eg, the per-host files they were read from), keeping their order
+    """
+    shards = {}
+    for line in lines:
+        shards.setdefault(shard_of_line.get(line), []).append(line)
+    return list(shards.values())
+
+def pack_shards(shards, line_chunk_size=1000):
+    """
+    Turn shards of lines into chunks - big shards are split up and small ones are packed together so
+    each chunk only holds lines from a handful of shards.
+    """
+    chunks = []
+    current_chunk = []
+    for shard in shards:
+        if len(shard) >= line_chunk_size:
+            chunks.extend(shard[i:i+line_chunk_size] for i in range(0, len(shard), line_chunk_size))
+            continue
+        if len(current_chunk) + len(shard) > line_chunk_size:
+            chunks.append(current_chunk)
+            current_chunk = []
+        current_chunk.extend(shard)
+    if len(current_chunk) > 0:
+        chunks.append(current_chunk)
+    return chunks
+
+# placeholders that normalize_log_line substitutes into a template - used to pull the literal text back out
+template_placeholder_regex = re.compile(r'\[\]|0xADDRESS|\bADDRESS\b|\bIP_ADDR\b|\bQUEUE_ID\b|\bN\b')
+
+# matches the timestamp and hostname at the start of a line, with the hostname as group 1 - suggested
+# normalise_map patterns start with this so their replacement can put the host back
+suggested_prefix_pattern = r'^(?:\w{3}\s+\d+\s+\d{2}:\d{2}:\d{2}\s+|\d{4}-\d{2}-\d{2}T\S+\s+)?(\S+)\s.*?'
+
+def template_message(template, line):
+    """
+    A template without the hostname normalize_log_line puts at the front, so the same message from
+    different hosts is one template
+    """
+    hostname = line_hostname(line)
+    return template[len(hostname) + 1:] if template.startswith(hostname + ' ') else template
+
+def suggest_filters(message, example_line):
+    """
+    Suggest an ignore_list string and a normalise_map tuple for a template's message, based on the literal
+    text left in it.  Only suggestions which still match the original example line are returned.  The
+    normalise_map replacement keeps the line's hostname.
+    """
+    pieces = [piece.strip(' :') for piece in template_placeholder_regex.split(message)]
+    # skip pieces which are just the punctuation between placeholders (eg, the dots in an IP address)
+    pieces = [piece for piece in pieces if re.search(r'[A-Za-z]', piece)]
+    if len(pieces) == 0:
+        return None, None
+    ignore_candidate = max(pieces, key=len)
+    if ignore_candidate not in example_line:
+        ignore_candidate = None
+    regex_candidate = suggested_prefix_pattern + '.+'.join(re.sub(r'([.^$*+?{}\[\]\\|()])', r'\\\1', piece) for piece in pieces)
+    if not re.search(regex_candidate, example_line):
+        return ignore_candidate, None
+    return ignore_candidate, (regex_candidate, '\\1 ' + message.replace('\\', '\\\\'))
+
+def profile_templates(log_lines, encoder, normalise_map=[], top_n=20):
+    """
+    Group lines by their normalised template (without the hostname) and count the tokens each template costs,
+    in a single pass.  Returns the total token count and the top_n templates as a list of dicts sorted by token
+    usage.
+    """
+    templates = {}
+    total_tokens = 0
+    for line in log_lines:
+        template = template_message(normalize_log_line(line, normalise_map), line)
+        # +1 for the newline each line is joined with when it is sent to the LLM
+        tokens = len(encoder.encode_ordinary(line)) + 1
+        total_tokens += tokens
+        if template not in templates:
+            templates[template] = {"template": template, "lines": 0, "tokens": 0, "example": line, "hosts": set()}
+        templates[template]["lines"] += 1
+        templates[template]["tokens"] += tokens
+        templates[template]["hosts"].add(line_hostname(line))
+
+    top_templates = sorted(templates.values(), key=lambda t: t["tokens"], reverse=True)[:top_n]
+    for entry in top_templates:
+        entry["share"] = entry["tokens"] / total_tokens if total_tokens else 0
+        entry["hosts"] = len(entry["hosts"])
+        entry["ignore_candidate"], entry["normalise_candidate"] = suggest_filters(entry["template"], entry["example"])
+    return total_tokens, top_templates
+
+syslog_line_regex = re.compile(r'^(\w{3}\s+\d+\s+\d{2}:\d{2}:\d{2})\s+(\S+)\s(.*)$')
+program_prefix_regex = re.compile(r'^\S+?(?:\[\d+\])?:\s')
+compact_line_prefix_regex = re.compile(r'^(?:[+-]\d+\s|=)?(?:\^\s)?')
+
+compact_format_prompt = """
+## Log Format
+
+To save space the log lines are grouped by host.  Each host block starts with a line `@<hostname> <timestamp>`,
+and every line in the block starts with the number of seconds since the previous line in that block (eg, `+5`).
+A `^` in place of the `program[pid]:` prefix means it is the same as on the line above.  Lines starting with `=`
+are copied verbatim.  For the example_log_entry field copy the message text of the line exactly as it appears.
+"""
+
+def _parse_syslog_timestamp(timestamp):
+    # syslog timestamps have no year, so use a leap year to make sure 'Feb 29' parses
+    return datetime.strptime(f"2000 {timestamp}", "%Y %b %d %H:%M:%S")
+
+def _format_syslog_timestamp(moment):
+    return f"{moment:%b} {moment.day:>2} {moment:%H:%M:%S}"
+
+def encode_compact(lines):
+    """
+    Encode log lines into a compact payload - lines are grouped by host, with timestamps made relative to
+    the previous line from the same host and repeated program[pid]: prefixes elided.  Any line which would
+    not decode back to exactly the original is passed through verbatim.
+    """
+    blocks = {}
+    for line in lines:
+        match = syslog_line_regex.match(line)
+        host = match.group(2) if match else None
+        blocks.setdefault(host, []).append((line, match))
+
+    payload = []
+    for host, block in blocks.items():
+        if host is None:
+            payload.extend(f"={line}" for line, match in block)
+            continue
+        base_moment = _parse_syslog_timestamp(block[0][1].group(1))
+        payload.append(f"@{host} {_format_syslog_timestamp(base_moment)}")
+        previous_moment = base_moment
+        previous_program = None
+        for line, match in block:
+            moment = _parse_syslog_timestamp(match.group(1))
+            message = match.group(3)
+            if f"{_format_syslog_timestamp(moment)} {host} {message}" != line or message.startswith("^ "):
+                payload.append(f"={line}")
+                continue
+            program_match = program_prefix_regex.match(message)
+            program = program_match.group(0) if program_match else None
+            if program is not None and program == previous_program:
+                message = "^ " + message[len(program):]
+            previous_program = program
+            payload.append(f"{int((moment - previous_moment).total_seconds()):+d} {message}")
+            previous_moment = moment
+    return "\n".join(payload)
+
+def decode_compact(payload):
+    """
+    Turn a payload from encode_compact back into the original log lines (in host-grouped order).
+    """
+    lines = []
+    host = None
+    moment = None
+    previous_program = None
+    for entry in payload.splitlines():
+        if entry.startswith("="):
+            lines.append(entry[1:])
+        elif entry.startswith("@"):
+            host, timestamp = entry[1:].split(" ", 1)
+            moment = _parse_syslog_timestamp(timestamp)
+            previous_program = None
+        else:
+            offset, message = entry.split(" ", 1)
+            moment = moment + timedelta(seconds=int(offset))
+            if message.startswith("^ "):
+                message = previous_program + message[2:]
+            program_match = program_prefix_regex.match(message)
+            previous_program = program_match.group(0) if program_match else None
+            lines.append(f"{_format_syslog_timestamp(moment)} {host} {message}")
+    return lines
+
+def restore_example_entry(example, lines):
+    """
+    Map an example_log_entry the LLM copied from a compact payload back to the exact original log line.
+    Returns the example unchanged if no single original line contains it.
+    """
+    text = compact_line_prefix_regex.sub('', example.strip().strip('`')).strip()
+    if text == "":
+        return example
+    for line in lines:
+        if text in line:
+            return line
+    # the LLM sometimes puts the hostname or the elided program back on the front
+    if " " in text:
+        text = text.split(" ", 1)[1]
+        for line in lines:
+            if text in line:
+                return line
+    return example
@@ -1,10 +1,18 @@
+import re
+import sys
+import time
 import smtplib
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.base import MIMEBase
+from email.utils import getaddresses
 from email import encoders
 
-def create_message(sender_email: str = "", bcc_email: str = "", subject: str = "Syslog Report", body: str = "Enjoy!", attachment_path: str = "temp.md"):
+def create_message(sender_email: str = "", bcc_email: str = "", subject: str = "Syslog Report", body: str = "Enjoy!", attachment_path: str = "temp.md", attachment_bytes: bytes = None, attachment_name: str = "report.md"):
+    """
+    Build the report email.  The attachment is read from attachment_path, or taken straight from
+    attachment_bytes if given so the report never has to be written to disk.
+    """
     message = MIMEMultipart()
     message["From"] = sender_email
     message["Bcc"] = bcc_email
@@ -12,14 +20,132 @@ def create_message(sender_email: str = "", bcc_email: str = "", subject: str = "
 
     message.attach(MIMEText(body, "plain"))
 
-    attachment = open(attachment_path, "rb")
+    if attachment_bytes is None:
+        with open(attachment_path, "rb") as attachment:
+            attachment_bytes = attachment.read()
+        attachment_name = attachment_path.split('/')[-1]
     part = MIMEBase("application", "octet-stream")
-    part.set_payload((attachment).read())
+    part.set_payload(attachment_bytes)
     encoders.encode_base64(part)
-    part.add_header("Content-Disposition", f"attachment; filename= {attachment_path.split('/')[-1]}")
+    part.add_header("Content-Disposition", f"attachment; filename= {attachment_name}")
     message.attach(part)
+    return message
 
 def send_email(sender_email: str = "", bcc_email: str = "", subject: str = "Syslog Report", body: str = "Enjoy!", attachment_path: str = "temp.md", smtp_server: str = "", smtp_port: int = 25):
     message = create_message(sender_email, bcc_email, subject, body, attachment_path)
     with smtplib.SMTP(smtp_server, smtp_port) as server:
         server.send_message(message)
+
+def report_messages(report: str, recipient_groups: list[str], sender_email: str, subject: str = "Syslog Report", body: str = "Enjoy!", attachment_name: str = "report.md"):
+    """
+    One message per group of recipients (eg, one per team), with the report attached straight from memory.
+    Each group is a comma-separated list of addresses, all Bcc'd so teams don't see each other's lists.
+    """
+    report_bytes = report.encode("utf-8")
+    return [create_message(sender_email, group, subject, body, attachment_bytes=report_bytes, attachment_name=attachment_name) for group in recipient_groups if group.strip()]
+
+def message_envelope(message):
+    """
+    The envelope sender, recipients and CRLF-terminated bytes for a message.  Like smtplib's send_message
+    this removes the Bcc header from the message.
+    """
+    sender = getaddresses([message["From"] or ""])[0][1]
+    recipients = [address for _, address in getaddresses(message.get_all("To", []) + message.get_all("Cc", []) + message.get_all("Bcc", [])) if address]
+    del message["Bcc"]
+    data = message.as_bytes(policy=message.policy.clone(linesep="\r\n"))
+    return sender, recipients, data
+
+def connect(smtp_server, smtp_port=25, username="", password="", starttls=False, timeout=30):
+    server = smtplib.SMTP(smtp_server, smtp_port, timeout=timeout)
+    server.ehlo()
+    if starttls:
+        server.starttls()
+        server.ehlo()
+    if username:
+        server.login(username, password)
+    return server
+
+def pipelined_send(server, sender, recipients, data):
+    """
+    Send one message with MAIL FROM, every RCPT TO and DATA in a single write (RFC 2920 pipelining), so a
+    message costs two round trips however many recipients it has.  Returns the refused recipients.
+    """
+    commands = [f"MAIL FROM:<{sender}>"] + [f"RCPT TO:<{recipient}>" for recipient in recipients] + ["DATA"]
+    server.send("".join(f"{command}\r\n" for command in commands))
+    replies = [server.getreply() for _ in commands]
+    mail_reply, recipient_replies, data_reply = replies[0], replies[1:-1], replies[-1]
+    refused = {recipient: reply for recipient, reply in zip(recipients, recipient_replies) if reply[0] not in (250, 251)}
+    if mail_reply[0] != 250 or data_reply[0] != 354:
+        if data_reply[0] == 354:
+            # the server is waiting for data we aren't going to send, so give it an empty message and throw it away
+            server.send(b".\r\n")
+            server.getreply()
+        server.rset()
+        if mail_reply[0] != 250:
+            raise smtplib.SMTPSenderRefused(mail_reply[0], mail_reply[1], sender)
+        if len(refused) == len(recipients):
+            raise smtplib.SMTPRecipientsRefused(refused)
+        raise smtplib.SMTPDataError(*data_reply)
+    # dot-stuffing, as smtplib.sendmail does
+    data = re.sub(br'(?m)^\.', b'..', data)
+    if not data.endswith(b"\r\n"):
+        data += b"\r\n"
+    server.send(data + b".\r\n")
+    code, response = server.getreply()
+    if code != 250:
+        server.rset()
+        raise smtplib.SMTPDataError(code, response)
+    return refused
+
+def is_connection_error(error):
+    # smtplib's exceptions are OSErrors too, so a plain OSError has to be told apart from an SMTP reply
+    return isinstance(error, smtplib.SMTPServerDisconnected) or (isinstance(error, OSError) and not isinstance(error, smtplib.SMTPException))
+
+def is_temporary(error):
+    # dropped connections and 4xx replies are worth retrying, anything else (eg, an unknown mailbox) isn't
+    if is_connection_error(error) or isinstance(error, smtplib.SMTPConnectError):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return any(400 <= code < 500 for code, _ in error.recipients.values())
+    return False
+
+def send_batch(messages, smtp_server, smtp_port=25, username="", password="", starttls=False, retries=3, retry_delay=2.0):
+    """
+    Send a list of messages over one SMTP connection, pipelining the commands if the server supports it.  A
+    dropped connection or temporary (4xx) failure reconnects if needed and retries the message up to retries
+    times; permanent failures are reported and the batch carries on.  Returns a list of (message, result)
+    where result is None if everyone got it, a dict of refused recipients, or the exception it failed with.
+    """
+    results = []
+    server = None
+    try:
+        for message in messages:
+            sender, recipients, data = message_envelope(message)
+            for attempt in range(retries + 1):
+                try:
+                    if server is None:
+                        server = connect(smtp_server, smtp_port, username, password, starttls)
+                    if server.has_extn("pipelining"):
+                        refused = pipelined_send(server, sender, recipients, data)
+                    else:
+                        refused = server.sendmail(sender, recipients, data)
+                    results.append((message, refused or None))
+                    break
+                except (smtplib.SMTPException, OSError) as e:
+                    if is_connection_error(e) and server is not None:
+                        server.close()
+                        server = None
+                    if not is_temporary(e) or attempt == retries:
+                        print(f"Error: Failed to send '{message['Subject']}' after {attempt + 1} attempts: {e}", file=sys.stderr)
+                        results.append((message, e))
+                        break
+                    time.sleep(retry_delay * (attempt + 1))
+    finally:
+        if server is not None:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+    return results
@@ -1,4 +1,4 @@
-from gepetto import gpt, gemini
+from gepetto import bot_factory
 from datetime import datetime
 import time
 import re
@@ -7,57 +7,240 @@ import json
 from collections import defaultdict
 import argparse
 import sys
-import tiktoken
+import functools
+import glob
 import logreader
-import classifier
+import verdicts
+import noisefilter
+import baseline
+import configcache
+import resolutioncache
+import mailer
+import checkpoint
+import profiler
+import patterncheck
 
-bot = gpt.GPTModelSync(model=gpt.Model.GPT_4_OMNI_MINI.value[0])
-# bot = gemini.GeminiModelSync()
+default_model = "gpt-4o-mini"
+# set by configure_hedging - when a hedge model is set, slow requests get a duplicate sent to it
+hedge_model = ""
+hedge_percentile = 0.95
+hedged_bots = []
+# the biggest chunk (in lines) each issue model can be sent without its answer getting cut off or garbled -
+# learnt during the run as chunks fail and get split, so later chunks are sent already split
+chunk_size_limits = {}
+min_split_lines = 25
 
-def scan_logfile(lines: list[str], log_scan_prompt: str, log_merge_prompt: str, line_chunk_size: int = 1000, model: str = gpt.Model.GPT_4_OMNI_MINI.value[0]) -> tuple[list[dict], float]:
-    chunks = [lines[i:i+line_chunk_size] for i in range(0, len(lines), line_chunk_size)]
+@functools.lru_cache(maxsize=None)
+def get_bot(model=default_model):
+    # backends are only created (and their SDKs imported) the first time a model is actually used
+    if hedge_model and hedge_model != model:
+        bot = bot_factory.get_hedged_bot(model, hedge_model, hedge_percentile)
+        hedged_bots.append(bot)
+        return bot
+    return bot_factory.get_bot(model)
+
+def configure_hedging(model, percentile=0.95):
+    global hedge_model, hedge_percentile
+    hedge_model = model
+    hedge_percentile = percentile
+    hedged_bots.clear()
+    get_bot.cache_clear()
+
+@functools.lru_cache(maxsize=None)
+def get_triage_bot(model):
+    return bot_factory.get_bot(model, vendor="ollama")
+
+def triage_chunk(content: str, triage_prompt: str, triage_model: str) -> bool:
+    """
+    Ask the local triage model if a chunk needs looking at by the issue model.  Anything other than a clear
+    "no" (including an answer we can't parse) counts as needing review.
+    """
+    messages = [
+        {
+            "role": "system",
+            "content": triage_prompt
+        },
+        {
+            "role": "user",
+            "content": content
+        }
+    ]
+    response = profiler.chat(get_triage_bot(triage_model), messages, "llm triage", model=triage_model, temperature=0)
+    message = response.message.strip().removeprefix("```json").removeprefix("```").removesuffix("```")
+    try:
+        return json.loads(message).get("needs_review") is not False
+    except (json.JSONDecodeError, AttributeError):
+        return True
+
+def scan_chunk(chunk: list[str], log_scan_prompt: str, model: str = default_model, compact: bool = False) -> tuple[list[dict], object]:
+    """
+    Ask the issue model about one chunk of lines.  Returns the issues it found (None if its answer was cut
+    short or couldn't be parsed) and the response itself for the cost/token counts.
+    """
+    if compact:
+        content = logreader.encode_compact(chunk)
+    else:
+        content = "\n".join(chunk)
+
+    messages = [
+        {
+            "role": "system",
+            "content": log_scan_prompt
+        },
+        {
+            "role": "user",
+            "content": content
+        }
+    ]
+    response = profiler.chat(get_bot(model), messages, "llm scan", model=model, temperature=0.1, json_format=True)
+    message = response.message.removeprefix("```json").removeprefix("```").removesuffix("```")
+    # sometimes the LLM will either return gibberish, or fail to escape the JSON properly
+    # so we ignore for now
+    # drop anything that isn't valid utf-8 (done in memory, so concurrent runs don't share a temp file)
+    message = message.encode("utf-8", errors="ignore").decode("utf-8", errors="ignore")
+    message = message.removeprefix("```json").removeprefix("```").replace("```", "") # do this a 2nd time for LLM reasons :-/
+    if response.finish_reason == "length":
+        print(f"Warning: {model} ran out of output tokens on a chunk of {len(chunk)} lines", file=sys.stderr)
+        return None, response
+    try:
+        chunk_issues = json.loads(message)["issues"]
+        if not isinstance(chunk_issues, list) or not all(isinstance(issue, dict) for issue in chunk_issues):
+            raise TypeError("issues should be a list of objects")
+        if compact:
+            # map the examples back to the real log lines so the report can be grepped for
+            for issue in chunk_issues:
+                issue["example_log_entry"] = logreader.restore_example_entry(issue.get("example_log_entry", ""), chunk)
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        # valid JSON in the wrong shape is treated like a truncated answer, so the chunk gets split and retried
+        print(f"Error: Failed to parse issues from response: {message}\n\n{e!r}", file=sys.stderr)
+        return None, response
+    return chunk_issues, response
+
+def scan_chunk_adaptive(chunk: list[str], log_scan_prompt: str, model: str = default_model, compact: bool = False) -> tuple[list[dict], float, int, int]:
+    """
+    Scan a chunk, and if the answer is cut short or can't be parsed, split it in half and scan each half
+    (down to min_split_lines).  Chunks bigger than the model has coped with so far this run are split before
+    they're sent.  Returns the issues, cost, tokens and the number of requests it took.
+    """
+    pending = [chunk]
+    issues = []
+    cost = 0
+    tokens = 0
+    requests = 0
+    while pending:
+        piece = pending.pop(0)
+        limit = chunk_size_limits.get(model, len(piece))
+        if len(piece) > limit:
+            pending[0:0] = [piece[i:i+limit] for i in range(0, len(piece), limit)]
+            continue
+        piece_issues, response = scan_chunk(piece, log_scan_prompt, model, compact)
+        cost += response.cost
+        tokens += response.tokens
+        requests += 1
+        if piece_issues is not None:
+            issues.extend(piece_issues)
+            continue
+        if len(piece) < min_split_lines * 2:
+            print(f"Error: Giving up on {len(piece)} lines starting `{piece[0][:80]}`", file=sys.stderr)
+            continue
+        half = len(piece) // 2
+        chunk_size_limits[model] = min(chunk_size_limits.get(model, half), half)
+        print(f"Splitting {len(piece)} lines in half and retrying (chunks for {model} now at most {chunk_size_limits[model]} lines)", file=sys.stderr)
+        pending[0:0] = [piece[:half], piece[half:]]
+    return issues, cost, tokens, requests
+
+def parse_merged_issues(response, model: str = default_model) -> list[dict]:
+    """
+    The merged_issues from the merge step's answer, or None if it was cut short or isn't the shape we asked
+    for - the chunks have all been paid for by then, so the caller falls back to the unmerged issues
+    """
+    if response.finish_reason == "length":
+        print(f"Warning: {model} ran out of output tokens merging the issues - reporting them unmerged", file=sys.stderr)
+        return None
+    message = response.message.removeprefix("```json").removeprefix("```").removesuffix("```")
+    try:
+        merged_issues = json.loads(message)["merged_issues"]
+        for merged_issue in merged_issues:
+            if not isinstance(merged_issue["issue_ids"], list) or not all(isinstance(issue_id, str) for issue_id in merged_issue["issue_ids"]):
+                raise TypeError("issue_ids should be a list of strings")
+    except (json.JSONDecodeError, KeyError, TypeError) as e:
+        print(f"Warning: Failed to parse the merged issues ({e!r}) - reporting them unmerged", file=sys.stderr)
+        return None
+    return merged_issues
+
+def scan_logfile(lines: list[str], log_scan_prompt: str, log_merge_prompt: str, line_chunk_size: int = 1000, model: str = default_model, compact: bool = False, severity_scores: list[int] = None, max_chunks: int = 0, shards: list[list[str]] = None, triage_model: str = "", triage_prompt: str = "", journal: checkpoint.RunJournal = None) -> tuple[list[dict], float]:
+    """
+    Scan the lines for issues a chunk at a time, then merge the issues found across chunks.  If a journal is
+    passed in, every finished chunk is recorded in it and chunks it already has are skipped.
+    """
+    if shards is not None:
+        chunks = logreader.pack_shards(shards, line_chunk_size)
+        if severity_scores is not None:
+            # keep the shards together, but scan the chunks with the most severe lines first
+            line_scores = dict(zip(lines, severity_scores))
+            chunks.sort(key=lambda chunk: max(line_scores.get(line, 0) for line in chunk), reverse=True)
+    elif severity_scores is not None:
+        chunks = logreader.severity_chunks(lines, severity_scores, line_chunk_size)
+    else:
+        chunks = [lines[i:i+line_chunk_size] for i in range(0, len(lines), line_chunk_size)]
     if len(chunks) > 1:
         print(f"Long log file - splitting into {len(chunks)} chunks", file=sys.stderr)
+    if max_chunks > 0 and len(chunks) > max_chunks:
+        skipped_lines = sum(len(chunk) for chunk in chunks[max_chunks:])
+        print(f"Only scanning {max_chunks} of {len(chunks)} chunks - skipping {skipped_lines} lines", file=sys.stderr)
+        chunks = chunks[:max_chunks]
     report = ""
     total_cost = 0
     issues = []
     final_issues = {}
+    if compact:
+        log_scan_prompt = log_scan_prompt + logreader.compact_format_prompt
+    scanned_chunks = 0
+    split_requests = 0
+    triage_time = 0
+    resumed_chunks = 0
     for chunk in chunks:
-        content = "\n".join(chunk)
-
-        messages = [
-            {
-                "role": "system",
-                "content": log_scan_prompt
-            },
-            {
-                "role": "user",
-                "content": content
-            }
-        ]
-        response = bot.chat(messages, model=model, temperature=0.1, json_format=True)
-        message = response.message.removeprefix("```json").removeprefix("```").removesuffix("```")
-        # sometimes the LLM will either return gibberish, or fail to escape the JSON properly
-        # so we ignore for now
-        # write the message to a file then read it back in ignoring any utf-8 errors
-        with open("temp_log_scan_output.txt", "w") as f:
-            f.write(message)
-        with open("temp_log_scan_output.txt", "r", encoding="utf-8", errors="ignore") as f:
-            message = f.read()
-            message = message.removeprefix("```json").removeprefix("```").replace("```", "") # do this a 2nd time for LLM reasons :-/
-        try:
-            issues.extend(json.loads(message)["issues"])
-        except json.JSONDecodeError as e:
-            print(f"Error: Failed to parse JSON from response: {message}\n\n{e}", file=sys.stderr)
-        total_cost += response.cost
-    if len(chunks) > 1 and len(report) < 50000:
+        chunk_key = checkpoint.chunk_hash(chunk)
+        if journal is not None and chunk_key in journal.done:
+            entry = journal.done[chunk_key]
+            issues.extend(entry["issues"])
+            total_cost += entry["cost"]
+            scanned_chunks += 1 if entry["scanned"] else 0
+            resumed_chunks += 1
+            continue
+        if triage_model:
+            triage_start = time.time()
+            needs_review = triage_chunk("\n".join(chunk), triage_prompt, triage_model)
+            triage_time += time.time() - triage_start
+            if not needs_review:
+                if journal is not None:
+                    journal.record(chunk_key, [], 0, 0, scanned=False)
+                continue
+        scanned_chunks += 1
+        with profiler.span("chunk", lines=len(chunk)) as span_args:
+            chunk_issues, chunk_cost, chunk_tokens, requests = scan_chunk_adaptive(chunk, log_scan_prompt, model, compact)
+            span_args["requests"] = requests
+            span_args["issues"] = len(chunk_issues)
+        split_requests += requests - 1
+        issues.extend(chunk_issues)
+        total_cost += chunk_cost
+        if journal is not None:
+            journal.record(chunk_key, chunk_issues, chunk_cost, chunk_tokens)
+    if resumed_chunks:
+        print(f"Resumed {resumed_chunks} of {len(chunks)} chunks from {journal.path}", file=sys.stderr)
+    if triage_model:
+        print(f"Triage: {triage_model} flagged {scanned_chunks} of {len(chunks)} chunks for {model} ({triage_time / max(len(chunks), 1):.1f}s per chunk)", file=sys.stderr)
+    if split_requests:
+        print(f"Splitting chunks took {split_requests} extra requests", file=sys.stderr)
+    # a split chunk needs merging even if it was the only one
+    if scanned_chunks + split_requests > 1 and len(report) < 50000:
         json_issues = {}
         for id, issue in enumerate(issues):
             json_issues[f"issue_{id + 1}"] = {
-                "description": issue["description"],
-                "affected_host(s)": issue["affected_host(s)"],
-                "example_log_entry": issue["example_log_entry"],
-                "affected_service": issue["affected_service"],
+                "description": issue.get("description", ""),
+                "affected_host(s)": issue.get("affected_host(s)", ""),
+                "example_log_entry": issue.get("example_log_entry", ""),
+                "affected_service": issue.get("affected_service", ""),
             }
         messages = [
             {
@@ -69,23 +252,23 @@ def scan_logfile(lines: list[str], log_scan_prompt: str, log_merge_prompt: str,
                 "content": json.dumps(json_issues, indent=4)
             }
         ]
-        response = bot.chat(messages, model=model, temperature=0.1, json_format=True)
-        message = response.message.removeprefix("```json").removeprefix("```").removesuffix("```")
-        merged_issues = json.loads(message)["merged_issues"]
+        response = profiler.chat(get_bot(model), messages, "llm merge", model=model, temperature=0.1, json_format=True)
         total_cost += response.cost
-        # first we need to copy the issues (a list) into the final_issues dict
-        for issue_id, issue in enumerate(issues):
-            final_issues[f"issue_{issue_id + 1}"] = issue
-        # now we remove any issue_ id's that are in the merged issues, apart from the first one in each issue_ids fields
-        for merged_issue in merged_issues:
-            for issue_id in merged_issue["issue_ids"][1:]:
-                if issue_id in final_issues:
-                    del final_issues[issue_id]
-        # now we merge the issues list to overwrite the affected_host(s)
-        for merged_issue in merged_issues:
-            for issue_id in merged_issue["issue_ids"]:
-                if issue_id in final_issues:
-                    final_issues[issue_id]["affected_host(s)"] = merged_issue["affected_host(s)"]
+        merged_issues = parse_merged_issues(response, model)
+        if merged_issues is not None:
+            # first we need to copy the issues (a list) into the final_issues dict
+            for issue_id, issue in enumerate(issues):
+                final_issues[f"issue_{issue_id + 1}"] = issue
+            # now we remove any issue_ id's that are in the merged issues, apart from the first one in each issue_ids fields
+            for merged_issue in merged_issues:
+                for issue_id in merged_issue["issue_ids"][1:]:
+                    if issue_id in final_issues:
+                        del final_issues[issue_id]
+            # now we merge the issues list to overwrite the affected_host(s)
+            for merged_issue in merged_issues:
+                for issue_id in merged_issue["issue_ids"]:
+                    if issue_id in final_issues and "affected_host(s)" in merged_issue:
+                        final_issues[issue_id]["affected_host(s)"] = merged_issue["affected_host(s)"]
     if len(final_issues) == 0:
         # no issues were merged, so copy the original issues list into the final_issues dict
         for issue_id, issue in enumerate(issues):
@@ -110,7 +293,7 @@ def issues_list_to_report(issues: dict) -> str:
         report += issue_to_report(issue)
     return report
 
-def get_resolution(issue: dict, resolution_prompt: str, suggestion_model: str = gpt.Model.GPT_4_OMNI_MINI.value[0]) -> tuple[str, float]:
+def get_resolution(issue: dict, resolution_prompt: str, suggestion_model: str = default_model) -> tuple[str, float]:
     # clear the original LLM recommendation so that this call can come up with it's own
     # rather than just spelling out a plan based on the original recommendation
     issue['recommended_action'] = ""
@@ -124,28 +307,83 @@ def get_resolution(issue: dict, resolution_prompt: str, suggestion_model: str =
             "content": issue_to_report(issue)
         }
     ]
-    response = bot.chat(messages, model=suggestion_model, temperature=0.1)
+    response = profiler.chat(get_bot(suggestion_model), messages, "llm resolution", model=suggestion_model, temperature=0.1)
     suggestion = response.message.removesuffix('```').removeprefix('```json`').removeprefix('```')
 
     return suggestion, response.cost
 
-def resolutions_to_report(issues: list[dict], resolution_prompt: str, suggestion_model: str = gpt.Model.GPT_4_OMNI_MINI.value[0]) -> tuple[str, float]:
+def resolutions_to_report(issues: list[dict], resolution_prompt: str, suggestion_model: str = default_model, cache_path: str = "", ttl_days: float = resolutioncache.default_ttl_days, normalise_map: list = []) -> tuple[str, float]:
+    """
+    Get a resolution for each issue.  With a cache_path, issues resolved within the last ttl_days (with the
+    same prompt and model) reuse the stored resolution instead of asking the LLM again.
+    """
     report = ""
     total_cost = 0
+    cache = resolutioncache.load_cache(cache_path) if cache_path else {}
+    prompt_key = resolutioncache.prompt_hash(resolution_prompt, suggestion_model)
+    cached_count = 0
     for issue in issues.values():
-        resolution, cost = get_resolution(issue, resolution_prompt, suggestion_model)
+        fingerprint = resolutioncache.issue_fingerprint(issue, normalise_map)
+        entry = resolutioncache.cached_resolution(cache, fingerprint, prompt_key, ttl_days) if cache_path else None
+        if entry is not None:
+            resolution = f"{entry['resolution']}\n\n_(resolution cached from {entry['resolved_at']})_"
+            cached_count += 1
+        else:
+            resolution, cost = get_resolution(issue, resolution_prompt, suggestion_model)
+            total_cost += cost
+            if cache_path:
+                resolutioncache.store_resolution(cache, fingerprint, prompt_key, issue, resolution, cost)
         report += f"{resolution}\n\n"
-        total_cost += cost
+    if cache_path:
+        resolutioncache.save_cache(cache, cache_path)
+        print(f"Resolutions: {cached_count} of {len(issues)} from the cache", file=sys.stderr)
     return report, total_cost
 
-def get_log_stats(lines, model=gpt.Model.GPT_4_OMNI_MINI.value[0]) -> tuple[int, int]:
-    enc = tiktoken.encoding_for_model(model)
-    return len(lines), len(enc.encode("\n".join(lines)))
+@functools.lru_cache(maxsize=None)
+def get_encoder(model=default_model):
+    import tiktoken
+    return tiktoken.encoding_for_model(model)
+
+def get_log_stats(lines, model=default_model) -> tuple[int, int]:
+    with profiler.span("tokenise", lines=len(lines)):
+        enc = get_encoder(model)
+        return len(lines), len(enc.encode("\n".join(lines)))
+
+def get_compact_stats(lines, model=default_model) -> tuple[int, bool]:
+    """
+    Count the tokens the compact payload would use, and check it decodes back to the original lines
+    """
+    enc = get_encoder(model)
+    payload = logreader.encode_compact(lines)
+    reconstructable = sorted(logreader.decode_compact(payload)) == sorted(lines)
+    return len(enc.encode(payload)), reconstructable
+
+def print_template_profile(top_templates):
+    print(f"Top {len(top_templates)} templates by token share:")
+    for entry in top_templates:
+        print(f"{entry['share'] * 100:6.2f}% {entry['tokens']:>9} tokens {entry['lines']:>7} lines {entry['hosts']:>4} hosts  {entry['template']}")
+        if entry["ignore_candidate"]:
+            print(f"        ignore_list candidate: {entry['ignore_candidate']!r}")
+        if entry["normalise_candidate"]:
+            print(f"        normalise_map candidate: (r\"{entry['normalise_candidate'][0]}\", {entry['normalise_candidate'][1]!r})")
 
 def check_file_args(file, output_file):
     """
-    Check if the input or output file should be stdin/stdout
+    Check if the input or output file should be stdin/stdout.  file can be a single path or a list of
+    paths/globs, in which case a list of files is returned.
     """
+    if isinstance(file, list):
+        file = [f for f in file if f != ""]
+        if len(file) == 0:
+            file = ""
+        elif len(file) == 1 and not glob.has_magic(file[0]):
+            file = file[0]
+        else:
+            patterns = file
+            file = logreader.expand_file_args(patterns)
+            if len(file) == 0:
+                print(f"Error: no files matched {' '.join(patterns)}", file=sys.stderr)
+                sys.exit(1)
     if file == "":
         file = sys.stdin
     if output_file == "":
@@ -156,21 +394,31 @@ def merge_configs(config, overrides):
     mergable_lists = ["ignore_list", "match_list", "regex_ignore_list", "normalise_map"]
     for list_name in mergable_lists:
         if hasattr(overrides, list_name):
-            setattr(config, list_name, list(set(getattr(config, list_name) + getattr(overrides, list_name))))
+            # overrides go first as the first matching normalise_map entry wins, and duplicates are dropped in order
+            setattr(config, list_name, list(dict.fromkeys(list(getattr(overrides, list_name)) + list(getattr(config, list_name)))))
     mergeable_dicts = ["replacement_map"]
     for dict_name in mergeable_dicts:
         if hasattr(overrides, dict_name):
             getattr(config, dict_name).update(getattr(overrides, dict_name))
-    prompt_attributes = ["log_scan_prompt", "resolution_prompt", "log_merge_prompt"]
+    prompt_attributes = ["log_scan_prompt", "resolution_prompt", "log_merge_prompt", "triage_prompt"]
     for prompt_name in prompt_attributes:
         if hasattr(overrides, prompt_name):
             setattr(config, prompt_name, getattr(overrides, prompt_name))
     return config
 
-def load_config(config_file, overrides):
+def load_config(config_file, overrides, verdict_store=verdicts.default_store_path, cache_dir=configcache.default_cache_dir):
+    """
+    Import the config and overrides, add the noise regexes from the verdict store and compile the lot.  The
+    compiled config is cached in cache_dir until any of those files change, so most runs skip all of that.
+    """
+    if config_file.endswith(".py"):
+        config_file = config_file[:-3]
+    source_files = [configcache.module_path(config_file) or config_file, overrides, verdict_store or ""]
+    if cache_dir:
+        config = configcache.load_cached_config(cache_dir, source_files)
+        if config is not None:
+            return config
     try:
-        if config_file.endswith(".py"):
-            config_file = config_file[:-3]
         config = __import__(config_file)
         if os.path.exists(overrides):
             overrides_file = overrides[:-3] if overrides.endswith(".py") else overrides
@@ -180,6 +428,13 @@ def load_config(config_file, overrides):
         print(f"Error: Failed to import config file {config_file}")
         print(e)
         sys.exit(1)
+    if verdict_store and os.path.exists(verdict_store):
+        # noise the classifier has already identified gets filtered before it costs any tokens
+        noise_patterns = verdicts.noise_regexes(verdicts.load_verdicts(verdict_store))
+        config.regex_ignore_list = config.regex_ignore_list + noise_patterns
+    config = configcache.compile_config(config)
+    if cache_dir:
+        configcache.save_cached_config(config, cache_dir, source_files)
     return config
 
 def output_final_report(report, cost, suggestions_cost, output_file, log_length, model, total_time):
@@ -194,52 +449,183 @@ def output_final_report(report, cost, suggestions_cost, output_file, log_length,
     else:
         with open(output_file, 'w') as file:
             file.write(final_report)
+    return final_report
+
+def main(file, resolutions, dry_count, remove_duplicates, config_file, output_file, show_log, overrides, issue_model = default_model, suggestion_model = default_model, top_templates = 0, compact = False, verdict_store = verdicts.default_store_path, noise_model = "", noise_threshold = 0.95, severity_order = False, max_chunks = 0, input_format = "text", baseline_db = "", novel_only = False, rate_spikes = False, config_cache = configcache.default_cache_dir, hedge_model = "", hedge_percentile = 0.95, triage_model = "", resolution_cache = "", resolution_ttl = resolutioncache.default_ttl_days, email_to = [], email_from = "", smtp_server = "localhost:25", smtp_starttls = False, run_dir = "", resume = False, token_budget = 0, host_chunks = False, profile = "", check_patterns = False, fast_patterns = False):
+    if profile:
+        profiler.start()
+    try:
+        start_time = time.time()
+        file, output_file = check_file_args(file, output_file)
+
+        profiler.stage("load config")
+        config = load_config(config_file, overrides, verdict_store, config_cache)
+        if hedge_model:
+            configure_hedging(hedge_model, hedge_percentile)
+        if triage_model and not config.triage_prompt:
+            print(f"Error: --triage-model needs a triage_prompt in {config_file}")
+            sys.exit(1)
+        for warning in config.pattern_warnings:
+            print(f"Warning: {warning}", file=sys.stderr)
+        if fast_patterns:
+            swapped = patterncheck.fast_patterns(config)
+            print(f"Fast patterns: {swapped} regexes are now checked for their literal text first", file=sys.stderr)
+        if check_patterns:
+            if file == sys.stdin:
+                print("Pattern check: can't sample stdin, give the log with --file", file=sys.stderr)
+            else:
+                patterncheck.print_pattern_profile(patterncheck.profile_patterns(config, patterncheck.sample_lines(file)))
+
+        profiler.stage("read and filter")
+        model = noisefilter.load_model(noise_model) if noise_model else None
+        shard_of_line = None
+        if isinstance(file, list):
+            file_lines = logreader.read_logfiles(file, config.ignore_list, config.match_list, config.replacement_map, config.regex_ignore_list, model, noise_threshold, journal=input_format == "journal")
+            print(f"Read {sum(len(lines) for lines in file_lines.values())} lines from {len(file_lines)} files", file=sys.stderr)
+            shard_of_line = {line: file for file, lines in file_lines.items() for line in lines}
+            log_contents = [line for lines in file_lines.values() for line in lines]
+        else:
+            log_contents = logreader.read_logfile(file, config.ignore_list, config.match_list, config.replacement_map, config.regex_ignore_list, model, noise_threshold, journal=input_format == "journal")
+        if len(log_contents) == 0:
+            print("No log entries found")
+            return
+
+        profiler.stage("dedup and normalise")
+        severity_keywords = getattr(config, "severity_keywords", logreader.default_severity_keywords)
+        severity_scores = None
+        template_counts = {} if baseline_db or token_budget else None
+        line_templates = [] if baseline_db or rate_spikes or token_budget else None
+        rates = logreader.TemplateRates() if rate_spikes else None
+        if remove_duplicates or baseline_db or rate_spikes or token_budget:
+            max_occurrences = 3 if remove_duplicates else len(log_contents)
+            if severity_order:
+                log_contents, severity_scores = logreader.filter_duplicate_logs(log_contents, max_occurrences=max_occurrences, normalise_map=config.normalise_map, with_scores=True, severity_keywords=severity_keywords, template_counts=template_counts, line_templates=line_templates, rates=rates)
+            else:
+                log_contents = logreader.filter_duplicate_logs(log_contents, max_occurrences=max_occurrences, normalise_map=config.normalise_map, template_counts=template_counts, line_templates=line_templates, rates=rates)
+        elif severity_order:
+            severity_scores = [logreader.score_log_line(line, severity_keywords) for line in log_contents]
+
+        spikes = {}
+        if rates is not None:
+            profiler.stage("rate spikes")
+            spikes = rates.spikes()
+            if spikes:
+                print(f"Rate spikes: {len(spikes)} templates had bursts well above their usual rate", file=sys.stderr)
+                annotated = logreader.annotate_spikes(log_contents, line_templates, spikes)
+                if shard_of_line is not None:
+                    for annotated_line, line in zip(annotated, log_contents):
+                        shard_of_line[annotated_line] = shard_of_line.get(line)
+                log_contents = annotated
+
+        if baseline_db:
+            profiler.stage("baseline")
+            template_baseline = baseline.TemplateBaseline(baseline_db)
+            if novel_only:
+                novel = template_baseline.novel_templates(template_counts)
+                # spiking templates are worth a look even if we've seen them before
+                keep = [template in novel or template in spikes for template in line_templates]
+                print(f"Novel only: {len(novel)} of {len(template_counts)} templates are new or unusually frequent - sending {sum(keep)} of {len(log_contents)} lines", file=sys.stderr)
+                log_contents = [line for line, kept in zip(log_contents, keep) if kept]
+                line_templates = [template for template, kept in zip(line_templates, keep) if kept]
+                if severity_scores is not None:
+                    severity_scores = [score for score, kept in zip(severity_scores, keep) if kept]
+            if not dry_count:
+                template_baseline.record_day(template_counts)
+            template_baseline.close()
+            if len(log_contents) == 0:
+                print("No new or unusual log entries found")
+                return
+
+        sampling = None
+        if token_budget:
+            profiler.stage("sampling")
+            log_length, token_length = get_log_stats(log_contents, issue_model)
+            if token_length > token_budget:
+                # the sampler works in characters, so convert the budget using this log's characters per token
+                char_budget = int(token_budget * sum(len(line) + 1 for line in log_contents) / token_length)
+                keep, sampling = logreader.stratified_sample(log_contents, line_templates, template_counts, char_budget, severity_scores, severity_keywords)
+                log_contents = [log_contents[index] for index in keep]
+                if severity_scores is not None:
+                    severity_scores = [severity_scores[index] for index in keep]
+                print(f"Token budget: sampled {len(log_contents)} of {log_length} lines to fit {token_length} tokens into {token_budget}", file=sys.stderr)
+
+        if show_log:
+            print("\n".join(log_contents))
+
+        if dry_count:
+            profiler.stage("dry count")
+            if top_templates > 0:
+                token_length, template_profile = logreader.profile_templates(log_contents, get_encoder(issue_model), config.normalise_map, top_templates)
+                print(f"Length: {len(log_contents)} lines")
+                print(f"Tokens: {token_length} tokens")
+                print_template_profile(template_profile)
+                return
+            log_length, token_length = get_log_stats(log_contents, issue_model)
+            print(f"Length: {log_length} lines")
+            print(f"Tokens: {token_length} tokens")
+            if compact:
+                compact_length, reconstructable = get_compact_stats(log_contents, issue_model)
+                saving = (1 - compact_length / token_length) * 100 if token_length else 0
+                print(f"Compact: {compact_length} tokens ({saving:.1f}% saving, {'reconstructable' if reconstructable else 'NOT reconstructable'})")
+            if spikes:
+                print(f"Rate spikes:\n{logreader.spikes_to_report(spikes)}")
+            if sampling:
+                print(f"Sampling:\n{logreader.sampling_to_report(sampling)}")
+            # for line in log_contents:
+            #     response = classifier.classify_log_line(line, bot)
+            #     print(response.message)
+            #     print(response.cost)
+            return
+
+        profiler.stage("scan")
+        shards = logreader.group_by_shard(log_contents, shard_of_line) if shard_of_line is not None else None
+        if host_chunks:
+            shards = logreader.group_by_host(log_contents)
+            print(f"Host chunks: {len(log_contents)} lines from {len(shards)} hosts", file=sys.stderr)
+        journal = None
+        if resume and not run_dir:
+            run_dir = checkpoint.default_run_dir
+        if run_dir:
+            scan_config = checkpoint.config_hash(config.log_scan_prompt, config.log_merge_prompt, issue_model, compact, severity_order, max_chunks, triage_model, config.triage_prompt)
+            journal = checkpoint.RunJournal(run_dir, log_contents, scan_config, resume)
+        issues, cost = scan_logfile(log_contents, config.log_scan_prompt, config.log_merge_prompt, model=issue_model, compact=compact, severity_scores=severity_scores, max_chunks=max_chunks, shards=shards, triage_model=triage_model, triage_prompt=config.triage_prompt, journal=journal)
+        report = issues_list_to_report(issues)
+        suggestions_cost = 0
+        if resolutions and not "No critical issues found" in report:
+            profiler.stage("resolutions")
+            suggestions_report, suggestions_cost = resolutions_to_report(issues, config.resolution_prompt, suggestion_model=suggestion_model, cache_path=resolution_cache, ttl_days=resolution_ttl, normalise_map=config.normalise_map)
+            report += f"\n\n## Suggestions\n\n{suggestions_report}"
+        if spikes:
+            report += f"\n\n## Rate spikes\n\n{logreader.spikes_to_report(spikes)}"
+        if sampling:
+            report += f"\n\n## Sampling\n\n{logreader.sampling_to_report(sampling)}"
+
+        if issue_model != suggestion_model:
+            used_model = f"{issue_model} (issues) and {suggestion_model} (suggestions)"
+        else:
+            used_model = issue_model
+        for hedged_bot in hedged_bots:
+            print(hedged_bot.stats_summary(), file=sys.stderr)
+        end_time = time.time()
+        total_time = end_time - start_time
+        profiler.stage("report")
+        final_report = output_final_report(report, cost, suggestions_cost, output_file, len(log_contents), used_model, total_time)
+        if journal is not None:
+            journal.finish()
+        if email_to:
+            profiler.stage("email")
+            smtp_host, _, smtp_port = smtp_server.partition(":")
+            messages = mailer.report_messages(final_report, email_to, email_from, subject=f"Syslog Report {datetime.now().strftime('%Y-%m-%d')}")
+            results = mailer.send_batch(messages, smtp_host, int(smtp_port or 25), os.getenv("SMTP_USERNAME", ""), os.getenv("SMTP_PASSWORD", ""), smtp_starttls)
+            print(f"Emailed the report to {sum(1 for _, result in results if result is None)} of {len(messages)} recipient groups", file=sys.stderr)
+    finally:
+        if profile:
+            profiler.stop(profile)
 
-def main(file, resolutions, dry_count, remove_duplicates, config_file, output_file, show_log, overrides, issue_model = gpt.Model.GPT_4_OMNI_MINI.value[0], suggestion_model = gpt.Model.GPT_4_OMNI_MINI.value[0]):
-    start_time = time.time()
-    file, output_file = check_file_args(file, output_file)
-
-    config = load_config(config_file, overrides)
-
-    log_contents = logreader.read_logfile(file, config.ignore_list, config.match_list, config.replacement_map, config.regex_ignore_list)
-    if len(log_contents) == 0:
-        print("No log entries found")
-        return
-
-    if remove_duplicates:
-        log_contents = logreader.filter_duplicate_logs(log_contents, max_occurrences=3, normalise_map=config.normalise_map)
-
-    if show_log:
-        print("\n".join(log_contents))
-
-    if dry_count:
-        log_length, token_length = get_log_stats(log_contents, issue_model)
-        print(f"Length: {log_length} lines")
-        print(f"Tokens: {token_length} tokens")
-        # for line in log_contents:
-        #     response = classifier.classify_log_line(line, bot)
-        #     print(response.message)
-        #     print(response.cost)
-        return
-
-    issues, cost = scan_logfile(log_contents, config.log_scan_prompt, config.log_merge_prompt, model=issue_model)
-    report = issues_list_to_report(issues)
-    suggestions_cost = 0
-    if resolutions and not "No critical issues found" in report:
-        suggestions_report, suggestions_cost = resolutions_to_report(issues, config.resolution_prompt, suggestion_model=suggestion_model)
-        report += f"\n\n## Suggestions\n\n{suggestions_report}"
-
-    if issue_model != suggestion_model:
-        used_model = f"{issue_model} (issues) and {suggestion_model} (suggestions)"
-    else:
-        used_model = issue_model
-    end_time = time.time()
-    total_time = end_time - start_time
-    output_final_report(report, cost, suggestions_cost, output_file, len(log_contents), used_model, total_time)
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser()
-    parser.add_argument("--file", type=str, required=False, default="")
+    parser.add_argument("--file", type=str, nargs="*", required=False, default=[""])
     parser.add_argument("--output-file", type=str, required=False, default="")
     parser.add_argument("--resolutions", action="store_true", required=False, default=True)
     parser.add_argument("--dry-count", action="store_true", required=False, default=False)
@@ -247,7 +633,39 @@ if __name__ == "__main__":
     parser.add_argument("--config-file", type=str, required=False, default="prompts")
     parser.add_argument("--show-log", action="store_true", required=False, default=False)
     parser.add_argument("--overrides", type=str, required=False, default="local_overrides.py")
-    parser.add_argument("--issue-model", type=str, required=False, default=gpt.Model.GPT_4_OMNI_MINI.value[0])
-    parser.add_argument("--suggestion-model", type=str, required=False, default=gpt.Model.GPT_4_OMNI_MINI.value[0])
+    parser.add_argument("--issue-model", type=str, required=False, default=default_model)
+    parser.add_argument("--suggestion-model", type=str, required=False, default=default_model)
+    parser.add_argument("--top-templates", type=int, required=False, default=0)
+    parser.add_argument("--compact", action="store_true", required=False, default=False)
+    parser.add_argument("--verdict-store", type=str, required=False, default=verdicts.default_store_path)
+    parser.add_argument("--noise-model", type=str, required=False, default="")
+    parser.add_argument("--noise-threshold", type=float, required=False, default=0.95)
+    parser.add_argument("--severity-order", action="store_true", required=False, default=False)
+    parser.add_argument("--max-chunks", type=int, required=False, default=0)
+    parser.add_argument("--input-format", type=str, required=False, default="text", choices=["text", "journal"])
+    parser.add_argument("--baseline-db", type=str, required=False, default="")
+    parser.add_argument("--novel-only", action="store_true", required=False, default=False)
+    parser.add_argument("--rate-spikes", action="store_true", required=False, default=False)
+    parser.add_argument("--config-cache", type=str, required=False, default=configcache.default_cache_dir)
+    parser.add_argument("--hedge-model", type=str, required=False, default="")
+    parser.add_argument("--hedge-percentile", type=float, required=False, default=0.95)
+    parser.add_argument("--triage-model", type=str, required=False, default="")
+    parser.add_argument("--resolution-cache", type=str, required=False, default="")
+    parser.add_argument("--resolution-ttl", type=float, required=False, default=resolutioncache.default_ttl_days)
+    parser.add_argument("--email-to", type=str, nargs="*", required=False, default=[])
+    parser.add_argument("--email-from", type=str, required=False, default="")
+    parser.add_argument("--smtp-server", type=str, required=False, default="localhost:25")
+    parser.add_argument("--smtp-starttls", action="store_true", required=False, default=False)
+    parser.add_argument("--run-dir", type=str, required=False, default="")
+    parser.add_argument("--resume", action="store_true", required=False, default=False)
+    parser.add_argument("--token-budget", type=int, required=False, default=0)
+    parser.add_argument("--host-chunks", action="store_true", required=False, default=False)
+    parser.add_argument("--profile", type=str, required=False, default="")
+    parser.add_argument("--check-patterns", action="store_true", required=False, default=False)
+    parser.add_argument("--fast-patterns", action="store_true", required=False, default=False)
     args = parser.parse_args()
-    main(args.file, args.resolutions, args.dry_count, args.remove_duplicates, args.config_file, args.output_file, args.show_log, args.overrides, args.issue_model, args.suggestion_model)
+    if args.novel_only and not args.baseline_db:
+        parser.error("--novel-only needs a --baseline-db to compare against")
+    if args.email_to and not args.email_from:
+        parser.error("--email-to needs an --email-from address")
+    main(args.file, args.resolutions, args.dry_count, args.remove_duplicates, args.config_file, args.output_file, args.show_log, args.overrides, args.issue_model, args.suggestion_model, args.top_templates, args.compact, args.verdict_store, args.noise_model, args.noise_threshold, args.severity_order, args.max_chunks, args.input_format, args.baseline_db, args.novel_only, args.rate_spikes, args.config_cache, args.hedge_model, args.hedge_percentile, args.triage_model, args.resolution_cache, args.resolution_ttl, args.email_to, args.email_from, args.smtp_server, args.smtp_starttls, args.run_dir, args.resume, args.token_budget, args.host_chunks, args.profile, args.check_patterns, args.fast_patterns)
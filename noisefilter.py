@@ -0,0 +1,148 @@
+import re
+import sys
+import json
+import math
+import time
+import zlib
+import argparse
+import verdicts
+
+default_model_path = "noise_model.json"
+
+# timestamps, hostnames and numbers say nothing about whether a line is noise, so they are dropped before hashing
+timestamp_regex = re.compile(r'^(?:\w{3}\s+\d+\s+\d{2}:\d{2}:\d{2}|\d{4}-\d{2}-\d{2}T\S+)\s+\S+\s+')
+token_regex = re.compile(r'[a-z_]{2,}')
+digits_table = str.maketrans('', '', '0123456789')
+
+class NoiseModel():
+    """
+    A multinomial naive Bayes model over hashed word unigrams and bigrams.  Scores are the probability that a
+    line is noise.  Scores are cached by the line with its timestamp/host/numbers removed, so the repeated
+    lines that make up most of a syslog are only scored once.
+    """
+    def __init__(self, weights=None, default_weight=0.0, prior=0.0, buckets=2**18):
+        self.weights = weights if weights is not None else {}
+        self.default_weight = default_weight
+        self.prior = prior
+        self.buckets = buckets
+        self.cache = {}
+
+    @staticmethod
+    def line_key(line):
+        return timestamp_regex.sub('', line, count=1).lower().translate(digits_table)
+
+    def features(self, key):
+        tokens = token_regex.findall(key)
+        grams = tokens + [f"{first} {second}" for first, second in zip(tokens, tokens[1:])]
+        return [zlib.crc32(gram.encode()) % self.buckets for gram in grams]
+
+    def score(self, line):
+        key = self.line_key(line)
+        if key in self.cache:
+            return self.cache[key]
+        log_odds = self.prior
+        for bucket in self.features(key):
+            log_odds += self.weights.get(bucket, self.default_weight)
+        # clamp so very long lines don't overflow math.exp
+        log_odds = max(min(log_odds, 50), -50)
+        probability = 1 / (1 + math.exp(-log_odds))
+        if len(self.cache) < 1000000:
+            self.cache[key] = probability
+        return probability
+
+    def filter(self, lines, threshold=0.95):
+        return [line for line in lines if self.score(line) < threshold]
+
+    def to_dict(self):
+        return {
+            "buckets": self.buckets,
+            "prior": self.prior,
+            "default_weight": self.default_weight,
+            "weights": {str(bucket): weight for bucket, weight in self.weights.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        weights = {int(bucket): weight for bucket, weight in data["weights"].items()}
+        return cls(weights, data["default_weight"], data["prior"], data["buckets"])
+
+def train(noise_lines, keep_lines, buckets=2**18, alpha=1.0) -> NoiseModel:
+    model = NoiseModel(buckets=buckets)
+    noise_counts = {}
+    keep_counts = {}
+    for lines, counts in ((noise_lines, noise_counts), (keep_lines, keep_counts)):
+        for line in lines:
+            for bucket in model.features(model.line_key(line)):
+                counts[bucket] = counts.get(bucket, 0) + 1
+    noise_total = sum(noise_counts.values())
+    keep_total = sum(keep_counts.values())
+    noise_denominator = math.log(noise_total + alpha * buckets)
+    keep_denominator = math.log(keep_total + alpha * buckets)
+    # buckets never seen in training all get the same weight, so only the seen ones need storing
+    model.default_weight = (math.log(alpha) - noise_denominator) - (math.log(alpha) - keep_denominator)
+    for bucket in set(noise_counts) | set(keep_counts):
+        noise_log_prob = math.log(noise_counts.get(bucket, 0) + alpha) - noise_denominator
+        keep_log_prob = math.log(keep_counts.get(bucket, 0) + alpha) - keep_denominator
+        model.weights[bucket] = noise_log_prob - keep_log_prob
+    model.prior = math.log((len(noise_lines) + 1) / (len(keep_lines) + 1))
+    return model
+
+def save_model(model: NoiseModel, path: str = default_model_path):
+    with open(path, "w") as f:
+        json.dump(model.to_dict(), f)
+
+def load_model(path: str = default_model_path) -> NoiseModel:
+    with open(path, "r") as f:
+        return NoiseModel.from_dict(json.load(f))
+
+def read_lines(path):
+    with open(path, "r", encoding="utf8", errors="ignore") as f:
+        return [line for line in f.read().splitlines() if line.strip() != ""]
+
+def training_lines_from_verdicts(stored_verdicts, keep_importance=6):
+    """
+    Turn the classifier verdict store into training data - noise verdicts are noise, anything rated as
+    significant is a line to keep
+    """
+    noise_lines = []
+    keep_lines = []
+    for verdict in stored_verdicts.values():
+        example_line = verdict.get("example_line")
+        if not example_line:
+            continue
+        if verdict.get("category") == "noise":
+            noise_lines.append(example_line)
+        elif (verdict.get("importance") or 0) >= keep_importance:
+            keep_lines.append(example_line)
+    return noise_lines, keep_lines
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--verdict-store", type=str, required=False, default=verdicts.default_store_path)
+    parser.add_argument("--noise-file", type=str, required=False, default="", help="file of extra lines to treat as noise")
+    parser.add_argument("--keep-file", type=str, required=False, default="", help="file of extra lines to treat as worth keeping (eg, issue example lines)")
+    parser.add_argument("--output", type=str, required=False, default=default_model_path)
+    parser.add_argument("--threshold", type=float, required=False, default=0.95)
+    args = parser.parse_args()
+
+    noise_lines, keep_lines = training_lines_from_verdicts(verdicts.load_verdicts(args.verdict_store))
+    if args.noise_file:
+        noise_lines += read_lines(args.noise_file)
+    if args.keep_file:
+        keep_lines += read_lines(args.keep_file)
+    if len(noise_lines) == 0 or len(keep_lines) == 0:
+        print(f"Error: Need both noise and keep lines to train (got {len(noise_lines)} noise, {len(keep_lines)} keep)", file=sys.stderr)
+        sys.exit(1)
+
+    model = train(noise_lines, keep_lines)
+    save_model(model, args.output)
+
+    # report how the model does on its own training data, and how fast it scores
+    scored_lines = noise_lines + keep_lines
+    start_time = time.time()
+    dropped_noise = sum(1 for line in noise_lines if model.score(line) >= args.threshold)
+    dropped_keep = sum(1 for line in keep_lines if model.score(line) >= args.threshold)
+    elapsed = max(time.time() - start_time, 1e-9)
+    print(f"Trained on {len(noise_lines)} noise and {len(keep_lines)} keep lines -> {args.output}")
+    print(f"At threshold {args.threshold}: drops {dropped_noise}/{len(noise_lines)} noise lines and {dropped_keep}/{len(keep_lines)} keep lines")
+    print(f"Scored {len(scored_lines)} lines at {len(scored_lines) / elapsed:,.0f} lines/sec")
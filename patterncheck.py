@@ -0,0 +1,186 @@
+import re
+import sys
+import time
+import itertools
+import statistics
+try:
+    from re import _parser as sre_parse
+    from re import _constants as sre_constants
+except ImportError:
+    # python < 3.11
+    import sre_parse
+    import sre_constants
+import logreader
+
+repeat_ops = (sre_constants.MAX_REPEAT, sre_constants.MIN_REPEAT)
+
+def _is_unbounded(op, av):
+    # possessive repeats never give back what they matched, so they can't backtrack
+    return op in repeat_ops and av[1] == sre_constants.MAXREPEAT
+
+def _contains_unbounded(subpattern):
+    for op, av in subpattern:
+        if _is_unbounded(op, av):
+            return True
+        if op in repeat_ops and _contains_unbounded(av[2]):
+            return True
+        if op == sre_constants.SUBPATTERN and _contains_unbounded(av[-1]):
+            return True
+        if op == sre_constants.BRANCH and any(_contains_unbounded(branch) for branch in av[1]):
+            return True
+    return False
+
+def _can_overlap(first, second):
+    # only single character repeats are compared - `.` overlaps with anything, otherwise they must be the same
+    first, second = list(first), list(second)
+    if len(first) != 1 or len(second) != 1:
+        return False
+    if first[0][0] == sre_constants.ANY or second[0][0] == sre_constants.ANY:
+        return True
+    return first == second
+
+def _find_risks(subpattern, risks):
+    previous = None
+    for op, av in subpattern:
+        if op in repeat_ops:
+            inner = av[2]
+            if _is_unbounded(op, av) and _contains_unbounded(inner):
+                risks.append("nested unbounded quantifiers (eg `(a+)+`) - can backtrack exponentially on lines that nearly match")
+            if _is_unbounded(op, av) and previous is not None and _can_overlap(previous, inner):
+                risks.append("unbounded quantifiers next to each other that match the same text (eg `.+.+`) - the regex tries every way of splitting the line between them")
+            _find_risks(inner, risks)
+            previous = inner if _is_unbounded(op, av) else None
+            continue
+        if op == sre_constants.SUBPATTERN:
+            _find_risks(av[-1], risks)
+        elif op == sre_constants.BRANCH:
+            for branch in av[1]:
+                _find_risks(branch, risks)
+        previous = None
+
+def backtracking_risks(pattern):
+    """
+    Look for the shapes of regex that backtrack badly, without running it.  Returns a list of reasons (empty
+    if it looks fine).
+    """
+    pattern = pattern.pattern if hasattr(pattern, "pattern") else pattern
+    try:
+        parsed = sre_parse.parse(pattern)
+    except re.error:
+        return []
+    risks = []
+    _find_risks(parsed, risks)
+    return list(dict.fromkeys(risks))
+
+def literal_pieces(regex):
+    """
+    If a compiled regex is just literal text joined by .* or .+ (eg, r'systemd.+Consumed'), return it as a
+    list of (literal, the fewest characters before it) for logreader.LiteralPrecheck, otherwise None
+    """
+    if regex.flags & (re.IGNORECASE | re.DOTALL):
+        return None
+    pieces = []
+    literal = ""
+    gap = 0
+    for op, av in sre_parse.parse(regex.pattern):
+        if op == sre_constants.LITERAL:
+            literal += chr(av)
+        elif op in repeat_ops and av[1] == sre_constants.MAXREPEAT and list(av[2]) == [(sre_constants.ANY, None)]:
+            if literal:
+                pieces.append((literal, gap))
+                literal = ""
+                gap = 0
+            gap += av[0]
+        else:
+            return None
+    if literal or gap:
+        pieces.append((literal, gap))
+    if not any(literal for literal, _ in pieces):
+        return None
+    return pieces
+
+def fast_pattern(regex):
+    """
+    A LiteralPrecheck for a simple pattern which starts with .* or .+ - with a literal prefix the regex engine
+    already skips to it faster than the pre-check can, so those are left alone
+    """
+    pieces = literal_pieces(regex) if isinstance(regex, re.Pattern) else None
+    if not pieces or sre_parse.parse(regex.pattern)[0][0] not in repeat_ops:
+        return regex
+    return logreader.LiteralPrecheck(regex, pieces)
+
+def fast_patterns(config):
+    """
+    Swap the simple `.*a.+b` patterns in the config's regex_ignore_list and normalise_map for literal pre-checks.
+    Returns how many were swapped.
+    """
+    swapped = 0
+    regex_ignore_list = []
+    for regex in config.regex_ignore_list:
+        regex_ignore_list.append(fast_pattern(regex))
+        swapped += regex_ignore_list[-1] is not regex
+    normalise_map = []
+    for regex, replacement in config.normalise_map:
+        normalise_map.append((fast_pattern(regex), replacement))
+        swapped += normalise_map[-1][0] is not regex
+    config.regex_ignore_list = regex_ignore_list
+    config.normalise_map = normalise_map
+    return swapped
+
+def config_patterns(config):
+    return [("regex_ignore_list", regex) for regex in config.regex_ignore_list] + [("normalise_map", regex) for regex, _ in config.normalise_map]
+
+def pattern_warnings(config):
+    warnings = []
+    for source, regex in config_patterns(config):
+        for risk in backtracking_risks(regex):
+            warnings.append(f"{source} pattern {regex.pattern!r}: {risk}")
+    return warnings
+
+def sample_lines(files, count=5000):
+    """
+    The first count lines of the log (split between the files), read straight from disk before any filtering
+    """
+    files = files if isinstance(files, list) else [files]
+    per_file = max(count // len(files), 1)
+    lines = []
+    for file in files:
+        lines.extend(itertools.islice(logreader.stream_log_lines(file), per_file))
+    return lines
+
+def profile_patterns(config, lines, time_budget=2.0):
+    """
+    Time every user pattern against the sample lines.  Patterns flagged by backtracking_risks aren't run, as
+    one bad line could hang the check itself.  A pattern stops being timed once it has used time_budget seconds.
+    Returns a list of dicts, slowest first.
+    """
+    results = []
+    for source, regex in config_patterns(config):
+        risks = backtracking_risks(regex)
+        result = {"source": source, "pattern": regex.pattern, "risks": risks, "lines": 0, "matches": 0, "seconds": 0.0, "per_line_us": None}
+        results.append(result)
+        if risks:
+            continue
+        start_time = time.perf_counter()
+        for index, line in enumerate(lines):
+            if regex.search(line):
+                result["matches"] += 1
+            result["lines"] += 1
+            if index % 256 == 0 and time.perf_counter() - start_time > time_budget:
+                break
+        result["seconds"] = time.perf_counter() - start_time
+        result["per_line_us"] = result["seconds"] / max(result["lines"], 1) * 1_000_000
+    # the ones too risky to run go first
+    results.sort(key=lambda result: float("inf") if result["per_line_us"] is None else result["per_line_us"], reverse=True)
+    return results
+
+def print_pattern_profile(results, slow_factor=10.0, top_n=10):
+    timed = [result["per_line_us"] for result in results if result["per_line_us"] is not None]
+    median = statistics.median(timed) if timed else 0
+    print(f"Pattern check: {len(results)} user patterns, median {median:.2f}us per line", file=sys.stderr)
+    for result in results[:top_n]:
+        if result["per_line_us"] is None:
+            print(f"  NOT RUN  {result['source']} {result['pattern']!r} - {result['risks'][0]}", file=sys.stderr)
+            continue
+        flag = "  SLOW" if median and result["per_line_us"] > median * slow_factor else ""
+        print(f"  {result['per_line_us']:7.2f}us {result['source']} {result['pattern']!r} ({result['matches']} of {result['lines']} sample lines){flag}", file=sys.stderr)
@@ -0,0 +1,120 @@
+import os
+import sys
+import json
+import time
+import threading
+import contextlib
+from gepetto import bot_factory
+
+class Profiler():
+    """
+    Collects timed spans and counters, and writes them out as Chrome trace events (open the file in
+    https://ui.perfetto.dev or chrome://tracing)
+    """
+    def __init__(self):
+        self.start_time = time.perf_counter()
+        self.events = []
+        self.totals = {}
+        self.counters = {}
+        self.lock = threading.Lock()
+        self.current_stage = None
+
+    def now(self):
+        return (time.perf_counter() - self.start_time) * 1_000_000
+
+    def add_span(self, name, category, start, duration, args):
+        with self.lock:
+            self.events.append({"name": name, "cat": category, "ph": "X", "ts": start, "dur": duration, "pid": os.getpid(), "tid": threading.get_ident(), "args": args})
+            total = self.totals.setdefault(name, {"count": 0, "total": 0.0, "max": 0.0})
+            total["count"] += 1
+            total["total"] += duration
+            total["max"] = max(total["max"], duration)
+
+    def stage(self, name):
+        """
+        End the current stage (if any) and start timing the next one
+        """
+        now = self.now()
+        if self.current_stage is not None:
+            stage_name, start = self.current_stage
+            self.add_span(stage_name, "stage", start, now - start, {})
+        self.current_stage = (name, now) if name else None
+
+    def count(self, name, value):
+        with self.lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+            self.events.append({"name": name, "ph": "C", "ts": self.now(), "pid": os.getpid(), "args": {name: self.counters[name]}})
+
+    def write(self, path):
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events, "displayTimeUnit": "ms"}, f)
+
+    def summary(self):
+        wall_time = self.now()
+        lines = [f"{'Stage':<24} {'Count':>7} {'Total s':>9} {'Mean ms':>9} {'Max ms':>9} {'% of run':>9}"]
+        for name, total in sorted(self.totals.items(), key=lambda item: item[1]["total"], reverse=True):
+            lines.append(f"{name:<24} {total['count']:>7} {total['total'] / 1_000_000:>9.2f} {total['total'] / total['count'] / 1000:>9.1f} {total['max'] / 1000:>9.1f} {total['total'] / wall_time * 100:>8.1f}%")
+        for name, value in self.counters.items():
+            lines.append(f"{name}: {round(value, 5)}")
+        return "\n".join(lines)
+
+# set by start() - while it's None, span() and count() do nothing
+active = None
+
+def start():
+    global active
+    active = Profiler()
+    return active
+
+def stop(trace_path=""):
+    """
+    Write the trace (if a path is given) and print the summary table
+    """
+    global active
+    if active is None:
+        return
+    active.stage(None)
+    if trace_path:
+        active.write(trace_path)
+        print(f"Wrote a trace of {len(active.events)} events to {trace_path}", file=sys.stderr)
+    print(active.summary(), file=sys.stderr)
+    active = None
+
+def stage(name):
+    """
+    Mark the start of the next stage of the run - the previous one ends here
+    """
+    if active is not None:
+        active.stage(name)
+
+@contextlib.contextmanager
+def span(name, category="stage", **args):
+    """
+    Time the enclosed block.  Yields the args dict so the block can add to what's recorded.
+    """
+    profiler = active
+    if profiler is None:
+        yield args
+        return
+    start_time = profiler.now()
+    try:
+        yield args
+    finally:
+        profiler.add_span(name, category, start_time, profiler.now() - start_time, args)
+
+def count(name, value):
+    if active is not None:
+        active.count(name, value)
+
+def chat(bot, messages, name="llm chat", **kwargs):
+    """
+    bot.chat, recorded as a span with its model, tokens and cost.  Options the bot doesn't take (eg, claude
+    has no json_format) are dropped.
+    """
+    with span(name, "llm", model=kwargs.get("model")) as args:
+        response = bot_factory.call_chat(bot, messages, **kwargs)
+        args["tokens"] = response.tokens
+        args["cost"] = response.cost
+    count("tokens", response.tokens)
+    count("cost", response.cost)
+    return response
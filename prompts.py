@@ -200,3 +200,13 @@ list!
 
 Remember, brevity is key. Provide only what an expert sysadmin needs to quickly address the issue.
 """
+
+triage_prompt = """
+You are doing a quick first pass over a chunk of Linux system logs before a more expensive review.  Decide if
+anything in the chunk could be worth a sysadmin's attention - errors, failures, crashes, security problems, hardware
+or disk faults, services restarting or timing out.  Routine noise (cron jobs, successful logins, sessions starting and
+stopping, normal service chatter) is not.  If in doubt, say it needs review.
+
+Respond only with valid JSON in this format:
+{"needs_review": true, "reason": "one short sentence"}
+"""
@@ -0,0 +1,281 @@
+import os
+import re
+import sys
+import time
+import socket
+import asyncio
+import argparse
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import logreader
+import noisefilter
+import verdicts
+import main
+
+rfc5424_regex = re.compile(r'^<(\d{1,3})>1 (\S+) (\S+) (\S+) (\S+) (\S+) (-|(?:\[(?:[^\]\\]|\\.)*\])+) ?(.*)$', re.DOTALL)
+# the hostname is only trusted if it follows a timestamp and isn't a "tag:" - otherwise a bare "sshd[1]: ..."
+# would take the tag as its host.  RFC 3164 doesn't require a "tag:" either, so untagged messages get a second try.
+rfc3164_regex = re.compile(r'^<(\d{1,3})>(?:(\w{3}\s+\d+\s+\d{2}:\d{2}:\d{2})\s+(?:(\S+(?<!:))\s+)?)?(\S+?:\s.*)$', re.DOTALL)
+rfc3164_untagged_regex = re.compile(r'^<(\d{1,3})>(?:(\w{3}\s+\d+\s+\d{2}:\d{2}:\d{2})\s+(?:(\S+)\s+)?)?(.*\S.*)$', re.DOTALL)
+digits_table = str.maketrans('123456789', '000000000')
+
+def parse_syslog_message(message, peer_host="UNKNOWN_HOST"):
+    """
+    Parse an RFC 5424 or RFC 3164 syslog message into a logreader.JournalLine (so the rest of the pipeline
+    gets the hostname and priority without re-parsing).  Returns None for anything we can't make sense of.
+    """
+    message = message.rstrip("\r\n\x00")
+    match = rfc5424_regex.match(message)
+    if match:
+        priority, timestamp, hostname, app, procid, _, _, text = match.groups()
+        try:
+            moment = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+        except ValueError:
+            moment = datetime.now()
+        timestamp = logreader._format_syslog_timestamp(moment)
+        hostname = peer_host if hostname == "-" else hostname
+        app = "unknown" if app == "-" else app
+        # RFC 5424 messages can start with a UTF-8 byte order mark
+        text = text.removeprefix("\ufeff")
+        body = f"{app}[{procid}]: {text}" if procid != "-" else f"{app}: {text}"
+    else:
+        match = rfc3164_regex.match(message) or rfc3164_untagged_regex.match(message)
+        if not match:
+            return None
+        priority, timestamp, hostname, body = match.groups()
+        timestamp = timestamp or logreader._format_syslog_timestamp(datetime.now())
+        hostname = hostname or peer_host
+    return logreader.JournalLine(f"{timestamp} {hostname} {body}", hostname, body, int(priority) % 8)
+
+class ReportWindow():
+    """
+    The deduplicated lines received since the last report.  Memory is bounded by max_lines kept lines and
+    max_templates distinct templates - the window asks to be closed when either fills up.
+    """
+    def __init__(self, max_occurrences=3, max_lines=20000, max_templates=200000):
+        self.max_occurrences = max_occurrences
+        self.max_lines = max_lines
+        self.max_templates = max_templates
+        self.started_at = time.time()
+        self.occurrences = {}
+        self.lines = []
+        self.scores = []
+        self.received = 0
+        self.filtered = 0
+        self.unparsed = 0
+
+    def is_full(self):
+        return len(self.lines) >= self.max_lines or len(self.occurrences) >= self.max_templates
+
+class SyslogReceiver():
+    """
+    Filters, normalises and deduplicates syslog messages as they arrive, and hands each window of kept lines
+    to on_window when it fills up or window_seconds have passed.  on_window runs in a single worker thread, so
+    reports for windows which close in quick succession are written one at a time.
+    """
+    def __init__(self, line_filter, normalise_map, on_window, severity_keywords=logreader.default_severity_keywords, window_seconds=3600, max_occurrences=3, max_lines=20000, max_templates=200000, template_cache_size=100000):
+        self.line_filter = line_filter
+        self.normalise_map = normalise_map
+        self.on_window = on_window
+        self.severity_keywords = severity_keywords
+        self.window_seconds = window_seconds
+        self.window_settings = (max_occurrences, max_lines, max_templates)
+        self.window = ReportWindow(*self.window_settings)
+        # normalising is the expensive part, so remember the template for each line 'shape' (the hostname
+        # plus the message with its digits zeroed) - lines that only differ by numbers share a template
+        self.template_cache = {}
+        self.template_cache_size = template_cache_size
+        self.pending_reports = set()
+        # the scan shares module state in main (eg, chunk_size_limits), so only one report runs at once
+        self.report_executor = ThreadPoolExecutor(max_workers=1)
+
+    def template_for(self, line):
+        key = (line.hostname, line.body.translate(digits_table))
+        template = self.template_cache.get(key)
+        if template is None:
+            template = logreader.normalize_log_line(line, self.normalise_map)
+            if len(self.template_cache) >= self.template_cache_size:
+                self.template_cache.clear()
+            self.template_cache[key] = template
+        return template
+
+    def handle_message(self, message, peer_host="UNKNOWN_HOST"):
+        window = self.window
+        window.received += 1
+        line = parse_syslog_message(message, peer_host)
+        if line is None:
+            window.unparsed += 1
+            return
+        line = self.line_filter(line)
+        if line is None:
+            window.filtered += 1
+            return
+        template = self.template_for(line)
+        count = window.occurrences.get(template, 0)
+        if count >= window.max_occurrences:
+            return
+        window.occurrences[template] = count + 1
+        window.lines.append(line)
+        window.scores.append(logreader.score_log_line(line, self.severity_keywords))
+        if window.is_full():
+            self.close_window()
+
+    def close_window(self):
+        window = self.window
+        self.window = ReportWindow(*self.window_settings)
+        if len(window.lines) == 0:
+            return
+        task = asyncio.get_running_loop().run_in_executor(self.report_executor, self.on_window, window)
+        self.pending_reports.add(task)
+        task.add_done_callback(self.pending_reports.discard)
+
+    async def run_schedule(self):
+        while True:
+            await asyncio.sleep(max(self.window.started_at + self.window_seconds - time.time(), 0.1))
+            if time.time() - self.window.started_at >= self.window_seconds:
+                self.close_window()
+
+class SyslogUDPProtocol(asyncio.DatagramProtocol):
+    def __init__(self, receiver):
+        self.receiver = receiver
+
+    def datagram_received(self, data, addr):
+        self.receiver.handle_message(data.decode("utf8", errors="ignore"), addr[0])
+
+class SyslogTCPProtocol(asyncio.Protocol):
+    """
+    TCP syslog, either octet-counted (RFC 6587 "<length> <message>") or newline-delimited
+    """
+    def __init__(self, receiver):
+        self.receiver = receiver
+        self.buffer = b""
+        self.peer_host = "UNKNOWN_HOST"
+
+    def connection_made(self, transport):
+        peer = transport.get_extra_info("peername")
+        if peer:
+            self.peer_host = peer[0]
+
+    def data_received(self, data):
+        self.buffer += data
+        buffer = self.buffer
+        position = 0
+        while position < len(buffer):
+            space = buffer.find(b" ", position, position + 12)
+            length = buffer[position:space] if space != -1 else b""
+            if length.isdigit():
+                end = space + 1 + int(length)
+                if end > len(buffer):
+                    break
+                message = buffer[space + 1:end]
+            else:
+                # not octet counted, so messages are newline delimited
+                newline = buffer.find(b"\n", position)
+                if newline == -1:
+                    break
+                end = newline + 1
+                message = buffer[position:newline]
+            position = end
+            if message.strip():
+                self.receiver.handle_message(message.decode("utf8", errors="ignore"), self.peer_host)
+        self.buffer = buffer[position:]
+
+def report_writer(config, reports_dir, issue_model, suggestion_model, resolutions=True, scan=True):
+    """
+    Build the on_window callback which turns a window of lines into a report file in reports_dir
+    """
+    def write_report(window):
+        start_time = time.time()
+        stamp = datetime.now().strftime("%Y-%m-%d_%H%M%S")
+        print(f"Window closed: {window.received} received, {window.unparsed} unparsed, {window.filtered} filtered, {len(window.lines)} kept", file=sys.stderr)
+        if not scan:
+            with open(os.path.join(reports_dir, f"window_{stamp}.log"), "w") as f:
+                f.write("\n".join(window.lines) + "\n")
+            return
+        issues, cost = main.scan_logfile(window.lines, config.log_scan_prompt, config.log_merge_prompt, model=issue_model, severity_scores=window.scores)
+        report = main.issues_list_to_report(issues)
+        suggestions_cost = 0
+        if resolutions and not "No critical issues found" in report:
+            suggestions_report, suggestions_cost = main.resolutions_to_report(issues, config.resolution_prompt, suggestion_model=suggestion_model)
+            report += f"\n\n## Suggestions\n\n{suggestions_report}"
+        used_model = issue_model if issue_model == suggestion_model else f"{issue_model} (issues) and {suggestion_model} (suggestions)"
+        main.output_final_report(report, cost, suggestions_cost, os.path.join(reports_dir, f"report_{stamp}.md"), len(window.lines), used_model, time.time() - start_time)
+
+    return write_report
+
+async def serve(receiver, host="0.0.0.0", udp_port=5514, tcp_port=5514):
+    loop = asyncio.get_running_loop()
+    transports = []
+    if udp_port:
+        transport, _ = await loop.create_datagram_endpoint(lambda: SyslogUDPProtocol(receiver), local_addr=(host, udp_port))
+        transports.append(transport)
+    server = None
+    if tcp_port:
+        server = await loop.create_server(lambda: SyslogTCPProtocol(receiver), host, tcp_port)
+    print(f"Listening for syslog on {host} (udp {udp_port or 'off'}, tcp {tcp_port or 'off'})", file=sys.stderr)
+    try:
+        await receiver.run_schedule()
+    finally:
+        for transport in transports:
+            transport.close()
+        if server is not None:
+            server.close()
+        receiver.close_window()
+        if receiver.pending_reports:
+            await asyncio.gather(*receiver.pending_reports)
+        receiver.report_executor.shutdown()
+
+def send_messages(lines, host="127.0.0.1", port=5514, protocol="udp", priority=13):
+    """
+    Replay log lines to a receiver as RFC 3164 messages - handy for testing the daemon locally
+    """
+    if protocol == "udp":
+        with socket.socket(socket.AF_INET, socket.SOCK_DGRAM) as sock:
+            for line in lines:
+                sock.sendto(f"<{priority}>{line}".encode("utf8"), (host, port))
+        return
+    with socket.create_connection((host, port)) as sock:
+        payload = b"".join(f"{len(message.encode('utf8'))} {message}".encode("utf8") for message in (f"<{priority}>{line}" for line in lines))
+        sock.sendall(payload)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", type=str, required=False, default="0.0.0.0")
+    parser.add_argument("--udp-port", type=int, required=False, default=5514)
+    parser.add_argument("--tcp-port", type=int, required=False, default=5514)
+    parser.add_argument("--window-seconds", type=int, required=False, default=3600)
+    parser.add_argument("--window-lines", type=int, required=False, default=20000)
+    parser.add_argument("--max-occurrences", type=int, required=False, default=3)
+    parser.add_argument("--reports-dir", type=str, required=False, default="reports")
+    parser.add_argument("--no-scan", action="store_true", required=False, default=False, help="write each window's kept lines out instead of calling the LLM")
+    parser.add_argument("--no-resolutions", action="store_true", required=False, default=False)
+    parser.add_argument("--config-file", type=str, required=False, default="prompts")
+    parser.add_argument("--overrides", type=str, required=False, default="local_overrides.py")
+    parser.add_argument("--verdict-store", type=str, required=False, default=verdicts.default_store_path)
+    parser.add_argument("--noise-model", type=str, required=False, default="")
+    parser.add_argument("--noise-threshold", type=float, required=False, default=0.95)
+    parser.add_argument("--issue-model", type=str, required=False, default=main.default_model)
+    parser.add_argument("--suggestion-model", type=str, required=False, default=main.default_model)
+    parser.add_argument("--send-file", type=str, required=False, default="", help="send the lines of this file to a running receiver and exit")
+    parser.add_argument("--send-protocol", type=str, required=False, default="udp", choices=["udp", "tcp"])
+    args = parser.parse_args()
+
+    if args.send_file:
+        with open(args.send_file, "r", encoding="utf8", errors="ignore") as f:
+            lines = [line for line in f.read().splitlines() if line.strip() != ""]
+        port = args.udp_port if args.send_protocol == "udp" else args.tcp_port
+        send_messages(lines, "127.0.0.1" if args.host == "0.0.0.0" else args.host, port, args.send_protocol)
+        print(f"Sent {len(lines)} messages", file=sys.stderr)
+        sys.exit(0)
+
+    config = main.load_config(args.config_file, args.overrides, args.verdict_store)
+    model = noisefilter.load_model(args.noise_model) if args.noise_model else None
+    line_filter = logreader.make_line_filter(config.ignore_list, config.match_list, config.replacement_map, config.regex_ignore_list, model, args.noise_threshold)
+    os.makedirs(args.reports_dir, exist_ok=True)
+    on_window = report_writer(config, args.reports_dir, args.issue_model, args.suggestion_model, not args.no_resolutions, not args.no_scan)
+    severity_keywords = getattr(config, "severity_keywords", logreader.default_severity_keywords)
+    receiver = SyslogReceiver(line_filter, config.normalise_map, on_window, severity_keywords, args.window_seconds, args.max_occurrences, args.window_lines)
+    try:
+        asyncio.run(serve(receiver, args.host, args.udp_port, args.tcp_port))
+    except KeyboardInterrupt:
+        pass
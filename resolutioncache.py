@@ -0,0 +1,116 @@
+import os
+import re
+import sys
+import json
+import hashlib
+import argparse
+from datetime import datetime, timedelta
+import logreader
+
+default_cache_path = "resolution_cache.json"
+default_ttl_days = 7
+
+def issue_hosts(issue: dict) -> list[str]:
+    hosts = issue.get("affected_host(s)") or ""
+    if isinstance(hosts, str):
+        hosts = re.split(r'[,\s]+', hosts)
+    return sorted({str(host).strip().lower() for host in hosts if str(host).strip()})
+
+def issue_fingerprint(issue: dict, normalise_map: list = []) -> str:
+    """
+    A key for an issue which stays the same from run to run - the service, the example line with its
+    timestamps/numbers normalised away and the set of hosts
+    """
+    service = str(issue.get("affected_service") or "").strip().lower()
+    template = logreader.normalize_log_line(str(issue.get("example_log_entry") or ""), normalise_map)
+    key = json.dumps([service, template, issue_hosts(issue)])
+    return hashlib.sha1(key.encode()).hexdigest()
+
+def prompt_hash(resolution_prompt: str, model: str) -> str:
+    # a new prompt or model should give new resolutions, so cached ones are only used if both match
+    return hashlib.sha1(f"{model}\n{resolution_prompt}".encode()).hexdigest()
+
+def load_cache(path: str = default_cache_path) -> dict:
+    """
+    Load the fingerprint -> resolution cache.  A missing or unreadable cache is treated as empty.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Warning: Failed to read resolution cache {path}: {e}", file=sys.stderr)
+        return {}
+
+def save_cache(cache: dict, path: str = default_cache_path):
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(cache, f, indent=4, sort_keys=True)
+    os.replace(temp_path, path)
+
+def cached_resolution(cache: dict, fingerprint: str, prompt_key: str, ttl_days: float = default_ttl_days):
+    """
+    The cached entry for an issue, or None if there isn't one, it is older than ttl_days or was made with a different prompt/model
+    """
+    entry = cache.get(fingerprint)
+    if entry is None or entry.get("prompt") != prompt_key:
+        return None
+    if datetime.now() - datetime.fromisoformat(entry["resolved_at"]) > timedelta(days=ttl_days):
+        return None
+    return entry
+
+def store_resolution(cache: dict, fingerprint: str, prompt_key: str, issue: dict, resolution: str, cost: float) -> dict:
+    cache[fingerprint] = {
+        "resolution": resolution,
+        "prompt": prompt_key,
+        "cost": cost,
+        "resolved_at": datetime.now().isoformat(timespec="seconds"),
+        "service": issue.get("affected_service"),
+        "hosts": issue_hosts(issue),
+        "example_log_entry": issue.get("example_log_entry"),
+    }
+    return cache
+
+def invalidate(cache: dict, should_remove) -> int:
+    """
+    Drop every entry for which should_remove(fingerprint, entry) is true, returning how many went
+    """
+    remove = [fingerprint for fingerprint, entry in cache.items() if should_remove(fingerprint, entry)]
+    for fingerprint in remove:
+        del cache[fingerprint]
+    return len(remove)
+
+def matches(pattern):
+    """
+    An invalidate() check for entries whose fingerprint, service, hosts or example line contain pattern
+    """
+    pattern = pattern.lower()
+    def should_remove(fingerprint, entry):
+        fields = [fingerprint, entry.get("service") or "", entry.get("example_log_entry") or ""] + entry.get("hosts", [])
+        return any(pattern in str(field).lower() for field in fields)
+    return should_remove
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="List or invalidate cached issue resolutions")
+    parser.add_argument("--cache", type=str, required=False, default=default_cache_path)
+    parser.add_argument("--forget", type=str, required=False, default="", help="drop entries whose fingerprint, service, hosts or example line contain this")
+    parser.add_argument("--expire", type=float, required=False, default=0, help="drop entries older than this many days")
+    parser.add_argument("--clear", action="store_true", required=False, default=False)
+    args = parser.parse_args()
+
+    cache = load_cache(args.cache)
+    removed = 0
+    if args.clear:
+        removed = invalidate(cache, lambda fingerprint, entry: True)
+    if args.forget:
+        removed += invalidate(cache, matches(args.forget))
+    if args.expire > 0:
+        cutoff = datetime.now() - timedelta(days=args.expire)
+        removed += invalidate(cache, lambda fingerprint, entry: datetime.fromisoformat(entry["resolved_at"]) < cutoff)
+    if args.clear or args.forget or args.expire > 0:
+        save_cache(cache, args.cache)
+        print(f"Removed {removed} cached resolutions, {len(cache)} left")
+    else:
+        for fingerprint, entry in sorted(cache.items(), key=lambda item: item[1]["resolved_at"]):
+            print(f"{fingerprint[:12]}  {entry['resolved_at']}  {entry.get('service')}  {','.join(entry.get('hosts', []))}  {entry.get('example_log_entry')}")
@@ -0,0 +1,112 @@
+import os
+import re
+import sys
+import json
+from datetime import datetime
+
+default_store_path = "classifier_verdicts.json"
+
+def load_verdicts(path: str = default_store_path) -> dict:
+    """
+    Load the template -> verdict store written by classifier.py.  A missing or unreadable store is treated as empty.
+    """
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (json.JSONDecodeError, OSError) as e:
+        print(f"Warning: Failed to read verdict store {path}: {e}", file=sys.stderr)
+        return {}
+
+def save_verdicts(verdicts: dict, path: str = default_store_path):
+    # write to a temp file and rename so a crash never leaves a half-written store behind
+    temp_path = f"{path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(verdicts, f, indent=4, sort_keys=True)
+    os.replace(temp_path, path)
+
+def record_verdicts(verdicts: dict, classified: dict) -> dict:
+    """
+    Add or update the store with the template -> classification results from classifier.classify_log_lines
+    """
+    now = datetime.now().isoformat(timespec="seconds")
+    for template, classification in classified.items():
+        verdict = verdicts.get(template, {"first_seen": now, "times_seen": 0})
+        verdict.update({
+            "category": classification.get("category"),
+            "importance": classification.get("importance"),
+            "confidence": classification.get("confidence"),
+            "suggested_regex": classification.get("suggested_regex"),
+            "example_line": classification.get("original_line"),
+            "last_seen": now,
+        })
+        verdict["times_seen"] += 1
+        verdicts[template] = verdict
+    return verdicts
+
+def touch_verdicts(verdicts: dict, templates) -> dict:
+    """
+    Mark already-known templates as seen again without re-classifying them
+    """
+    now = datetime.now().isoformat(timespec="seconds")
+    for template in templates:
+        if template in verdicts:
+            verdicts[template]["last_seen"] = now
+            verdicts[template]["times_seen"] += 1
+    return verdicts
+
+def compile_noise_regex(pattern, example_line=None):
+    """
+    Compile a suggested regex, returning None if it is invalid, would match every line, or doesn't
+    match the line it was suggested for.
+    """
+    if not isinstance(pattern, str) or pattern.strip() == "" or pattern == "null":
+        return None
+    try:
+        compiled = re.compile(pattern)
+    except re.error:
+        return None
+    if compiled.search("") is not None:
+        return None
+    if example_line and compiled.search(example_line) is None:
+        return None
+    return compiled
+
+def _importance(verdict):
+    try:
+        return float(verdict.get("importance") or 0)
+    except (TypeError, ValueError):
+        return 0
+
+def noise_regexes(verdicts: dict, min_confidence: float = 0.8, protect_importance: float = 6) -> list[re.Pattern]:
+    """
+    The compiled suggested regexes for every template the classifier confidently called noise.  A regex is
+    skipped if it would also drop the example line of a template that isn't noise, or that was rated at
+    protect_importance or above (6+ is "significant" in the classifier prompt) - otherwise one over-broad
+    suggestion like `sshd.+` would quietly hide security events.
+    """
+    protected = [
+        (template, verdict["example_line"]) for template, verdict in verdicts.items()
+        if verdict.get("example_line") and (verdict.get("category") != "noise" or _importance(verdict) >= protect_importance)
+    ]
+    patterns = []
+    seen = set()
+    for template, verdict in verdicts.items():
+        if verdict.get("category") != "noise":
+            continue
+        try:
+            if float(verdict.get("confidence") or 0) < min_confidence:
+                continue
+        except (TypeError, ValueError):
+            continue
+        compiled = compile_noise_regex(verdict.get("suggested_regex"), verdict.get("example_line"))
+        if compiled is None or compiled.pattern in seen:
+            continue
+        clash = next((other for other, example_line in protected if other != template and compiled.search(example_line)), None)
+        if clash is not None:
+            print(f"Warning: Skipping noise regex {compiled.pattern!r} - it also matches the example for '{clash}' ({verdicts[clash].get('category')}, importance {verdicts[clash].get('importance')})", file=sys.stderr)
+            continue
+        seen.add(compiled.pattern)
+        patterns.append(compiled)
+    return patterns